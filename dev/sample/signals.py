@@ -1,13 +1,25 @@
 from django.dispatch import receiver
-from django.core.exceptions import ObjectDoesNotExist
-from gsheets.signals import sheet_row_processed
+from django.db.models.functions import Lower
+from gsheets.signals import sheet_rows_processed
 from .models import Car, Person
 
 
-@receiver(sheet_row_processed, sender=Car)
-def tie_car_to_owner(instance=None, created=None, row_data=None, **kwargs):
-    try:
-        instance.owner = Person.objects.get(last_name__iexact=row_data['owner_last_name'])
-        instance.save()
-    except (ObjectDoesNotExist, KeyError):
-        pass
+@receiver(sheet_rows_processed, sender=Car)
+def tie_cars_to_owners(instances=None, created=None, row_data=None, **kwargs):
+    last_names = {data['owner_last_name'].lower() for data in row_data if data.get('owner_last_name')}
+    if not last_names:
+        return
+
+    owners = {
+        p.last_name_lower: p
+        for p in Person.objects.annotate(last_name_lower=Lower('last_name')).filter(last_name_lower__in=last_names)
+    }
+
+    cars = []
+    for instance, data in zip(instances, row_data):
+        owner = owners.get(data.get('owner_last_name', '').lower())
+        if owner is not None:
+            instance.owner = owner
+            cars.append(instance)
+
+    Car.objects.bulk_update(cars, ['owner'])
@@ -1,8 +1,34 @@
 from django.contrib import admin
-from .models import AccessCredentials
+from .models import AccessCredentials, SheetOutbox, SheetEdit, SheetRevision, SyncCheckpoint
 
 
 @admin.register(AccessCredentials)
 class AccessCredentialsAdmin(admin.ModelAdmin):
-    fields = ('token', 'refresh_token', 'token_uri', 'scopes', 'created_time',)
-    readonly_fields = ('token_uri', 'scopes', 'created_time')
+    list_display = ('__str__', 'is_active', 'leased_time', 'rate_limited_until', 'rate_limit_count',)
+    fields = ('token', 'refresh_token', 'token_uri', 'scopes', 'service_account_info', 'is_active', 'leased_time',
+              'rate_limited_until', 'rate_limit_count', 'created_time',)
+    readonly_fields = ('token_uri', 'scopes', 'leased_time', 'rate_limit_count', 'created_time')
+
+
+@admin.register(SheetOutbox)
+class SheetOutboxAdmin(admin.ModelAdmin):
+    list_display = ('model', 'object_id', 'claimed_time', 'created_time',)
+    readonly_fields = ('created_time',)
+
+
+@admin.register(SheetEdit)
+class SheetEditAdmin(admin.ModelAdmin):
+    list_display = ('spreadsheet_id', 'sheet_name', 'row', 'claimed_time', 'created_time',)
+    readonly_fields = ('created_time',)
+
+
+@admin.register(SheetRevision)
+class SheetRevisionAdmin(admin.ModelAdmin):
+    list_display = ('model', 'spreadsheet_id', 'sheet_name', 'revision', 'checked_time',)
+    readonly_fields = ('checked_time',)
+
+
+@admin.register(SyncCheckpoint)
+class SyncCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('direction', 'model', 'spreadsheet_id', 'sheet_name', 'position', 'updated_time',)
+    readonly_fields = ('updated_time',)
@@ -3,3 +3,18 @@ from django.apps import AppConfig
 
 class GsheetsConfig(AppConfig):
     name = 'gsheets'
+
+    def ready(self):
+        from django.apps import apps
+        from .mixins import SheetPushableMixin
+        from .writebehind import connect_write_behind
+        from .outbox import connect_outbox
+
+        for model in apps.get_models():
+            if not issubclass(model, SheetPushableMixin):
+                continue
+
+            if model.write_behind:
+                connect_write_behind(model)
+            if model.transactional_outbox:
+                connect_outbox(model)
@@ -1,7 +1,7 @@
 from django.urls import reverse
+from .settings import gsheets_settings
 import re
 import logging
-import google.oauth2.credentials
 
 logger = logging.getLogger(__name__)
 
@@ -26,11 +26,33 @@ def get_oauth_cb_url(request):
     return ensure_https(callback_url)
 
 
+def get_oauth_flow(state=None):
+    """ builds the OAuth flow authorizing access to the sheets with the configured client secrets and scopes
+    :param state: `str` state of a started flow, when completing it
+    :return: `google_auth_oauthlib.flow.Flow`
+    """
+    import google_auth_oauthlib.flow
+
+    return google_auth_oauthlib.flow.Flow.from_client_secrets_file(
+        gsheets_settings.CLIENT_SECRETS, scopes=gsheets_settings.SCOPES, state=state
+    )
+
+
 def get_gapi_credentials(access_credentials):
     """ gets an instance of google oauth2 credentials given an instance of our canonical AccessCredentials object
     :param access_credentials: `AccessCredentials`
-    :return: `google.oauth2.credentials` instance
+    :return: `google.oauth2.credentials` instance, or `google.oauth2.service_account.Credentials` for service accounts
     """
+    import google.oauth2.credentials
+
+    if access_credentials.service_account_info:
+        # service accounts sign their own tokens, there's no OAuth refresh token round-trip
+        import google.oauth2.service_account
+
+        return google.oauth2.service_account.Credentials.from_service_account_info(
+            access_credentials.parsed_service_account_info, scopes=access_credentials.parsed_scopes
+        )
+
     return google.oauth2.credentials.Credentials(
         token=access_credentials.token,
         refresh_token=access_credentials.refresh_token,
@@ -0,0 +1,110 @@
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from .settings import gsheets_settings
+import hashlib
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# how long (in seconds) a process may hold the lock on fetching a range before others fetch it themselves
+FETCH_LOCK_TIMEOUT = 30
+# how often (in seconds) processes waiting on another's fetch check the cache for its result
+FETCH_POLL_INTERVAL = 0.1
+
+
+def get_cache():
+    """ gets the Django cache holding sheet reads
+    :return: the cache, None when the read cache is disabled by a `CACHE_ALIAS` of None or a dummy cache backend
+    """
+    if gsheets_settings.CACHE_ALIAS is None:
+        return None
+
+    cache = caches[gsheets_settings.CACHE_ALIAS]
+    return None if isinstance(cache, DummyCache) else cache
+
+
+def get_generation_key(spreadsheet_id, sheet_name):
+    return f'gsheets:generation:{spreadsheet_id}:{sheet_name}'
+
+
+def get_generation(spreadsheet_id, sheet_name):
+    """ gets the cache generation of a sheet, which changes every time the sheet is written to
+    :param spreadsheet_id: `str` ID of a Google Sheets spreadsheet
+    :param sheet_name: `str` name of the sheet inside the spreadsheet
+    :return: `int`
+    """
+    cache = get_cache()
+    if cache is None:
+        return 0
+
+    key = get_generation_key(spreadsheet_id, sheet_name)
+    cache.add(key, 0, timeout=None)
+
+    return cache.get(key, 0)
+
+
+def invalidate_sheet(spreadsheet_id, sheet_name):
+    """ moves a sheet to a new cache generation, so every range of it cached before is read again from the API
+    :param spreadsheet_id: `str` ID of a Google Sheets spreadsheet
+    :param sheet_name: `str` name of the sheet inside the spreadsheet
+    """
+    cache = get_cache()
+    if cache is None:
+        # nothing is cached, don't make every write talk to the cache backend for nothing
+        return
+
+    key = get_generation_key(spreadsheet_id, sheet_name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # no generation yet (or it was evicted): anything cached under the old generation is unreachable either way
+        cache.add(key, 1, timeout=None)
+
+
+def get_range_key(spreadsheet_id, sheet_name, range, options):
+    digest = hashlib.blake2b(f'{range}|{sorted(options.items())}'.encode('utf-8'), digest_size=16).hexdigest()
+    return f'gsheets:range:{spreadsheet_id}:{digest}:{get_generation(spreadsheet_id, sheet_name)}'
+
+
+def read_through(spreadsheet_id, sheet_name, range, options, ttl, fetch):
+    """ gets the values of a sheet range from the cache, fetching and caching them on a miss. Only one process fetches
+    a missing range at a time (single-flight), the others wait for its result instead of all hitting the API
+    :param spreadsheet_id: `str` ID of a Google Sheets spreadsheet
+    :param sheet_name: `str` name of the sheet the range is in
+    :param range: `str` the range read
+    :param options: `dict` of read options changing what's read, like `valueRenderOption`
+    :param ttl: `int` seconds to keep the values cached
+    :param fetch: `callable` reading the values from the API
+    :return: the values, as returned by `fetch`, fetched every time when the read cache is disabled
+    """
+    cache = get_cache()
+    if cache is None:
+        return fetch()
+
+    key = get_range_key(spreadsheet_id, sheet_name, range, options)
+    lock_key = f'{key}:lock'
+
+    values = cache.get(key)
+    if values is not None:
+        logger.debug(f'read {range} of {spreadsheet_id} from the cache')
+        return values
+
+    deadline = time.monotonic() + FETCH_LOCK_TIMEOUT
+    while not cache.add(lock_key, 1, timeout=FETCH_LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            logger.warning(f'gave up waiting on another fetch of {range} of {spreadsheet_id}, fetching it')
+            return fetch()
+
+        time.sleep(FETCH_POLL_INTERVAL)
+        values = cache.get(key)
+        if values is not None:
+            return values
+
+    try:
+        values = fetch()
+        cache.set(key, values, timeout=ttl)
+    finally:
+        cache.delete(lock_key)
+
+    return values
@@ -0,0 +1,176 @@
+from django.utils import timezone
+from django.db.models import F
+from .auth import get_gapi_credentials
+from .settings import gsheets_settings
+from collections import Counter
+import datetime
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Google APIs only gzip responses for clients whose user agent contains "gzip"
+USER_AGENT = 'django-gsheets (gzip)'
+
+
+class SyncStats(Counter):
+    """ counts of the API requests made by sheet interfaces (`requests`) and the bytes of the request and response
+    bodies (`bytes_sent`, `bytes_received`, the latter counted once decompressed). Safe to update from several threads
+    """
+    def __init__(self):
+        super(SyncStats, self).__init__()
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            self.update(counts)
+
+
+class MeteredHttp(object):
+    """ wraps an http object to ask for gzipped responses and count every request made through it in a `SyncStats` """
+    def __init__(self, http, stats):
+        """
+        :param http: `httplib2.Http` like object, usually an `AuthorizedHttp`
+        :param stats: `SyncStats` to count requests in
+        """
+        self.http = http
+        self.stats = stats
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        headers = dict(headers or {}, **{'user-agent': USER_AGENT, 'accept-encoding': 'gzip'})
+        response, content = self.http.request(uri, method=method, body=body, headers=headers, **kwargs)
+
+        body_size = len(body.encode('utf-8') if isinstance(body, str) else body or b'')
+        self.stats.add(requests=1, bytes_sent=body_size, bytes_received=len(content or b''))
+
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+def build_client(service, version, credentials, stats):
+    """ builds a client for a Google API which requests gzipped responses and counts its requests
+    :param service: `str` name of the API, like 'sheets'
+    :param version: `str` version of the API, like 'v4'
+    :param credentials: `google.oauth2.Credentials`
+    :param stats: `SyncStats` to count requests in
+    :return: `googleapiclient.discovery.Resource`
+    """
+    from googleapiclient.discovery import build
+    from googleapiclient.http import build_http
+    from google_auth_httplib2 import AuthorizedHttp
+
+    http = MeteredHttp(AuthorizedHttp(credentials, http=build_http()), stats)
+    return build(service, version, http=http)
+
+
+def lease_access_credentials():
+    """ picks the credentials for a sync. Without the `CREDENTIAL_POOL` setting that's the most recently authorized
+    active account. With it, it's the active credentials used least recently among the ones not cooling down after a rate
+    limit, or the ones available again soonest when they all are
+    :return: `AccessCredentials`
+    :raises: `ValueError` if no credentials have been created
+    """
+    from .models import AccessCredentials
+
+    if not gsheets_settings.CREDENTIAL_POOL:
+        ac = AccessCredentials.objects.filter(is_active=True).order_by('-created_time').first()
+    else:
+        now = timezone.now()
+        active = AccessCredentials.objects.filter(is_active=True)
+        ac = active.exclude(rate_limited_until__gt=now).order_by(F('leased_time').asc(nulls_first=True)).first()
+        if ac is None:
+            ac = active.order_by('rate_limited_until').first()
+        if ac is not None:
+            AccessCredentials.objects.filter(id=ac.id).update(leased_time=now)
+
+    if ac is None:
+        raise ValueError('you must authenticate gsheets at /gsheets/authorize/ before usage')
+
+    logger.debug(f'leased credentials {ac.id}')
+    return ac
+
+
+def report_rate_limited(access_credentials):
+    """ records that the API rate limited a set of credentials, so the pool skips them for `CREDENTIAL_COOLDOWN`
+    seconds
+    :param access_credentials: `AccessCredentials`
+    """
+    from .models import AccessCredentials
+
+    logger.info(f'credentials {access_credentials.id} were rate limited, cooling them down')
+    AccessCredentials.objects.filter(id=access_credentials.id).update(
+        rate_limited_until=timezone.now() + datetime.timedelta(seconds=gsheets_settings.CREDENTIAL_COOLDOWN),
+        rate_limit_count=F('rate_limit_count') + 1
+    )
+
+
+def load_credentials():
+    """ gets the credentials of the most recently authorized account, or the next pooled credentials
+    :return: `google.oauth2.Credentials`
+    :raises: `ValueError` if no credentials have been created
+    """
+    return get_gapi_credentials(lease_access_credentials())
+
+
+class SheetClients(object):
+    """ credentials and API clients shared by the interfaces syncing many sheets in one go, so credentials are loaded
+    (and refreshed) once and the API discovery document is fetched once per thread instead of once per sheet. API
+    clients aren't thread safe, so each thread builds its own and reuses it for every sheet it syncs. With the
+    `CREDENTIAL_POOL` setting on, each thread also leases its own credentials, so parallel syncs spread across the
+    pool's quotas. The requests of every client are counted in the shared `stats`
+    """
+    def __init__(self, credentials=None):
+        """
+        :param credentials: `google.oauth2.Credentials` to use, leased from the `AccessCredentials` by default
+        """
+        self._credentials = credentials
+        self._pooled = credentials is None and gsheets_settings.CREDENTIAL_POOL
+        self.stats = SyncStats()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def credentials(self):
+        if self._pooled:
+            local = self._local.__dict__
+            if 'credentials' not in local:
+                local['access_credentials'] = lease_access_credentials()
+                local['credentials'] = get_gapi_credentials(local['access_credentials'])
+
+            return local['credentials']
+
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = load_credentials()
+
+        return self._credentials
+
+    def get(self, service, version):
+        """ gets this thread's client for a Google API
+        :param service: `str` name of the API, like 'sheets'
+        :param version: `str` version of the API, like 'v4'
+        :return: `googleapiclient.discovery.Resource`
+        """
+        clients = self._local.__dict__.setdefault('clients', {})
+        if (service, version) not in clients:
+            logger.debug(f'building {service} {version} client for thread {threading.current_thread().name}')
+            clients[(service, version)] = build_client(service, version, self.credentials, self.stats)
+
+        return clients[(service, version)]
+
+    def rotate(self):
+        """ puts this thread's rate limited credentials in cool down and drops its clients, so the thread's next
+        request leases other pooled credentials
+        :return: `bool` whether the credentials were rotated
+        """
+        if not self._pooled:
+            return False
+
+        local = self._local.__dict__
+        if 'access_credentials' in local:
+            report_rate_limited(local['access_credentials'])
+
+        local.clear()
+        return True
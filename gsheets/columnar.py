@@ -0,0 +1,113 @@
+from array import array
+import sys
+
+
+def rows_memory_usage(rows):
+    """ approximates the memory held by a list of rows, counted like `ColumnarSheetData.memory_usage` so the two
+    stores can be compared
+    :param rows: `list` of `list` of cell values
+    :return: `int` bytes
+    """
+    seen = set()
+    total = sys.getsizeof(rows)
+
+    for row in rows:
+        total += sys.getsizeof(row)
+        for value in row:
+            if id(value) not in seen:
+                seen.add(id(value))
+                total += sys.getsizeof(value)
+
+    return total
+
+
+class ColumnarSheetData(object):
+    """ a compact, column-oriented stand-in for the list of rows returned by the Sheets API. Cells are stored in one
+    list per column with repeated strings interned, and the length of each row is kept separately so ragged rows
+    (the API drops trailing empty cells) read back exactly as they were given. Rows are materialized as plain lists on
+    access, so it can be used wherever the list of rows is expected
+    """
+    def __init__(self, rows=None):
+        self._columns = []
+        self._lengths = array('L')
+
+        for row in rows or []:
+            self.append(row)
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._row(i)
+
+    def __getitem__(self, ix):
+        if isinstance(ix, slice):
+            return [self._row(i) for i in range(*ix.indices(len(self)))]
+
+        return self._row(self._row_index(ix))
+
+    def __setitem__(self, ix, row):
+        ix = self._row_index(ix)
+        self._add_columns(len(row))
+
+        for c, column in enumerate(self._columns):
+            column[ix] = ColumnarSheetData._intern(row[c]) if c < len(row) else None
+
+        self._lengths[ix] = len(row)
+
+    def append(self, row):
+        """ adds a row to the end of the data
+        :param row: `list` of cell values
+        """
+        self._add_columns(len(row))
+
+        for c, column in enumerate(self._columns):
+            column.append(ColumnarSheetData._intern(row[c]) if c < len(row) else None)
+
+        self._lengths.append(len(row))
+
+    def column(self, ix):
+        """ gets the values of a column without materializing any rows
+        :param ix: `int` index of the column
+        :return: `list` with one value per row, None where the row is too short to have the cell
+        """
+        if ix >= len(self._columns):
+            return [None] * len(self)
+
+        return self._columns[ix]
+
+    def memory_usage(self):
+        """ approximates the memory held by the data, counting each distinct cell value once
+        :return: `int` bytes
+        """
+        seen = set()
+        total = sys.getsizeof(self._columns) + sys.getsizeof(self._lengths)
+
+        for column in self._columns:
+            total += sys.getsizeof(column)
+            for value in column:
+                if id(value) not in seen:
+                    seen.add(id(value))
+                    total += sys.getsizeof(value)
+
+        return total
+
+    def _row(self, ix):
+        return [self._columns[c][ix] for c in range(self._lengths[ix])]
+
+    def _row_index(self, ix):
+        if ix < 0:
+            ix += len(self)
+        if not 0 <= ix < len(self):
+            raise IndexError('sheet data row index out of range')
+
+        return ix
+
+    def _add_columns(self, count):
+        while len(self._columns) < count:
+            self._columns.append([None] * len(self))
+
+    @staticmethod
+    def _intern(value):
+        return sys.intern(value) if type(value) is str else value
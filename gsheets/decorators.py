@@ -205,6 +205,7 @@ def backoff_on_predicate(wait_gen,
 def backoff_on_exception(wait_gen,
                          exception,
                          max_tries=None,
+                         giveup=lambda e: False,
                          jitter=full_jitter,
                          on_success=None,
                          on_backoff=None,
@@ -221,6 +222,9 @@ def backoff_on_exception(wait_gen,
             up. Once exhausted, the exception will be allowed to escape.
             The default value of None means their is no limit to the
             number of tries.
+        giveup: Function accepting an exception instance and
+            returning whether or not to give up. Optional. The default
+            is to always continue.
         jitter: A function of the value yielded by wait_gen returning
             the actual time to wait. This distributes wait times
             stochastically in order to avoid timing collisions across
@@ -255,8 +259,8 @@ def backoff_on_exception(wait_gen,
                 try:
                     tries += 1
                     ret = target(*args, **kwargs)
-                except exception:
-                    if max_tries is not None and tries == max_tries:
+                except exception as e:
+                    if giveup(e) or (max_tries is not None and tries == max_tries):
                         for hdlr in giveup_hdlrs:
                             hdlr({'target': target,
                                   'args': args,
@@ -0,0 +1,50 @@
+from django.apps import apps
+from .models import SheetEdit
+from .mixins import SheetPullableMixin
+from .queues import drain_entries
+from .settings import gsheets_settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def get_pullable_models(spreadsheet_id, sheet_name):
+    """ finds the models pulling from the given sheet, either as their own sheet or as one of their shards
+    :param spreadsheet_id: `str` ID of a Google Sheets spreadsheet
+    :param sheet_name: `str` name of the sheet inside the spreadsheet
+    :return: `list` of `SheetPullableMixin` model classes
+    """
+    return [
+        m for m in apps.get_models()
+        if issubclass(m, SheetPullableMixin) and (spreadsheet_id, sheet_name) in m.get_sheet_locations()
+    ]
+
+
+def pull_edited_rows(location, edits):
+    """ pulls the rows of a sheet edits were queued for into every model syncing the sheet
+    :param location: `two-tuple` of spreadsheet ID and sheet name
+    :param edits: `list` of `SheetEdit`
+    """
+    spreadsheet_id, sheet_name = location
+    rows = sorted({edit.row for edit in edits})
+    models = get_pullable_models(spreadsheet_id, sheet_name)
+    if not models:
+        logger.warning(f'no pullable model syncs sheet {sheet_name} of spreadsheet {spreadsheet_id}, dropping edits')
+
+    for model in models:
+        logger.debug(f'pulling {len(rows)} edited rows into model {model}')
+        model.pull_sheet_rows(rows, location=location)
+
+
+def drain_sheet_edits(batch_size):
+    """ claims up to `batch_size` queued sheet edits and pulls the edited rows into the models syncing those sheets.
+    Each pulled batch commits on its own before the IDs it created are written back to the sheet. Edits are only
+    deleted once their sheet's pull succeeded, the edits of a failed pull are released for the next drain. Claims
+    older than `EDIT_CLAIM_TIMEOUT` are from drainers that died mid pull and can be claimed again
+    :param batch_size: `int` the max number of edits to claim
+    :return: `int` the number of edits drained
+    """
+    return drain_entries(
+        SheetEdit, batch_size, gsheets_settings.EDIT_CLAIM_TIMEOUT,
+        lambda edit: (edit.spreadsheet_id, edit.sheet_name), pull_edited_rows
+    )
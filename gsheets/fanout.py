@@ -0,0 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
+
+
+def fan_out(fn, items, max_workers):
+    """ calls `fn` on every item from a bounded pool of threads
+    :param fn: `callable` taking one item
+    :param items: `list` of items
+    :param max_workers: `int` the max number of concurrent calls
+    :return: `list` of results in the order of the items
+    :raises: the first exception raised by a call, once all calls are done
+    """
+    if max_workers is None or max_workers <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+
+    def call(item):
+        try:
+            return fn(item)
+        finally:
+            # each thread gets its own DB connection, don't leave it open once the thread is done with it
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(call, items))
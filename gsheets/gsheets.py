@@ -1,19 +1,96 @@
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
+from django.db import router, transaction
 from .auth import get_gapi_credentials
-from .signals import sheet_row_processed
+from .clients import build_client, lease_access_credentials, report_rate_limited, SyncStats
+from .settings import gsheets_settings
+from .signals import sheet_row_processed, sheet_rows_processed
+from .columnar import ColumnarSheetData
+from .values import cell_holds_value, get_value_plan
+from .related import get_related_lookups
+from .pipeline import BackgroundWriter
+from .cache import invalidate_sheet, read_through
+from .query import SheetQuerySet
+from .syncing import syncing
 from . import decorators
+from collections import deque
+import multiprocessing
+import functools
+import sys
+from decimal import Decimal
+import hashlib
 import string
 import re
 import logging
 
 logger = logging.getLogger(__name__)
 
+# the max number of cells sent in one sparse `spreadsheets.batchUpdate` request
+SPARSE_WRITE_MAX_CELLS = 10000
+# the max number of attempts of an API request failing with a transient error, and the max wait (in seconds) between two
+HTTP_MAX_TRIES = 10
+HTTP_MAX_BACKOFF = 64
+
+
+def backoff_on_http_error(target):
+    """ retries the decorated function with exponential backoff, up to `HTTP_MAX_TRIES` times, when it raises a Google
+    API `HttpError` for a rate limit or a server error. Other errors, like a bad range or a missing spreadsheet, are
+    raised right away. The Google client library is only imported on the first call, so importing this module (and the
+    models using it) stays cheap
+    """
+    retrying = None
+
+    @functools.wraps(target)
+    def call(*args, **kwargs):
+        nonlocal retrying
+        if retrying is None:
+            from googleapiclient.errors import HttpError
+
+            retrying = decorators.backoff_on_exception(
+                decorators.expo, HttpError, max_tries=HTTP_MAX_TRIES, giveup=is_permanent_error,
+                on_backoff=rotate_rate_limited_credentials, max_value=HTTP_MAX_BACKOFF
+            )(target)
+
+        return retrying(*args, **kwargs)
+
+    return call
+
+
+def get_error_status(error):
+    """ gets the HTTP status of a Google API `HttpError`
+    :return: `int` or None for other errors
+    """
+    return getattr(getattr(error, 'resp', None), 'status', None)
+
+
+def is_rate_limit_error(error):
+    """ checks whether a Google API `HttpError` means the request was rate limited
+    :return: `bool`
+    """
+    status = get_error_status(error)
+    # Sheets answers 429 when over quota, Drive answers 403 with a (user) rate limit exceeded reason
+    return status == 429 or (status == 403 and b'ateLimitExceeded' in (getattr(error, 'content', None) or b''))
+
+
+def is_permanent_error(error):
+    """ checks whether retrying a request failing with a Google API `HttpError` is pointless, which it is for every
+    error but rate limits and server errors
+    :return: `bool`
+    """
+    status = get_error_status(error)
+    return not (is_rate_limit_error(error) or (status is not None and status >= 500))
+
+
+def rotate_rate_limited_credentials(details):
+    """ backoff handler moving a sheet interface to other pooled credentials when its request was rate limited """
+    interface = details['args'][0] if details['args'] else None
+    if is_rate_limit_error(sys.exc_info()[1]) and isinstance(interface, BaseSheetInterface):
+        interface.rotate_credentials()
+
 
 class BaseSheetInterface(object):
     def __init__(self, model_cls, spreadsheet_id, sheet_name=None, data_range=None, model_id_field=None,
-                 sheet_id_field=None, batch_size=None, max_rows=None, max_col=None, **kwargs):
+                 sheet_id_field=None, batch_size=None, max_rows=None, max_col=None, checksum_field=None, columnar=False,
+                 typed_values=False, related_lookups=None, resumable=False, clients=None, read_cache_ttl=None, **kwargs):
         """
         :param model_cls: `models.Model` subclass this interface applies to
         :param spreadsheet_id: `str` ID of a Google Sheets spreadsheet
@@ -24,6 +101,17 @@ class BaseSheetInterface(object):
         :param batch_size: `int` the batch size determines at what point sheet data is written-out to the Google sheet
         :param max_rows: `int` the max rows to support in the sheet
         :param max_col: `str` max column to support in the sheet
+        :param checksum_field: `str` name of an optional sheet column storing a digest of each row's synced values
+        :param columnar: `bool` whether to hold sheet data in a compact `ColumnarSheetData` instead of a list of rows
+        :param typed_values: `bool` whether to read unformatted values and serial dates, converting them to and from
+        python values with a `ValuePlan` compiled from the model's field types
+        :param related_lookups: `dict` of related field name to `three-tuple` of the related model, the lookup on it and
+        the sheet column holding the lookup value (see `RelatedLookup`)
+        :param resumable: `bool` whether to record checkpoints so a failed pull or push resumes where it stopped
+        :param clients: `SheetClients` holding credentials and API clients shared with other interfaces, None to load
+        credentials and build clients for this interface alone
+        :param read_cache_ttl: `int` seconds to keep the sheet data in the Django cache (see `gsheets.cache`) once read,
+        shared by every process. None to always read the sheet from the API
         """
         self.model_cls = model_cls
         self.spreadsheet_id = spreadsheet_id
@@ -34,11 +122,25 @@ class BaseSheetInterface(object):
         self.batch_size = batch_size
         self.max_rows = max_rows
         self.max_col = max_col
+        self.checksum_field = checksum_field
+        self.columnar = columnar
+        self.typed_values = typed_values
+        self.related_lookups = get_related_lookups(model_cls, related_lookups)
+        self.resumable = resumable
+        self.clients = clients
+        self.read_cache_ttl = read_cache_ttl
+        # requests made and bytes sent and received, shared with the other interfaces when clients are shared
+        self.stats = clients.stats if clients is not None else SyncStats()
 
         self._api = None
+        self._drive_api = None
         self._credentials = None
+        self._access_credentials = None
         self._sheet_data = None
         self._sheet_headers = None
+        self._sheet_id_index = None
+        self._grid_sheet_id = None
+        self._checksum_column_indexes = None
 
     @property
     def credentials(self):
@@ -46,40 +148,142 @@ class BaseSheetInterface(object):
         :return `google.oauth2.Credentials`
         :raises: `ValueError` if no credentials have been created
         """
-        from .models import AccessCredentials
+        if self.clients is not None:
+            return self.clients.credentials
 
         if self._credentials:
             return self._credentials
 
-        ac = AccessCredentials.objects.order_by('-created_time').first()
-        if ac is None:
-            raise ValueError('you must authenticate gsheets at /gsheets/authorize/ before usage')
-
-        self._credentials = get_gapi_credentials(ac)
+        self._access_credentials = lease_access_credentials()
+        self._credentials = get_gapi_credentials(self._access_credentials)
 
         return self._credentials
 
+    def rotate_credentials(self):
+        """ puts the rate limited credentials of this interface in cool down and switches to other pooled credentials,
+        when the `CREDENTIAL_POOL` setting is on
+        :return: `bool` whether the credentials were rotated
+        """
+        if self.clients is not None:
+            return self.clients.rotate()
+
+        if not gsheets_settings.CREDENTIAL_POOL or self._access_credentials is None:
+            return False
+
+        report_rate_limited(self._access_credentials)
+        self._access_credentials = self._credentials = self._api = self._drive_api = None
+        return True
+
     @property
     def api(self):
         if self._api is not None:
             return self._api
 
-        self._api = build('sheets', 'v4', credentials=self.credentials)
+        if self.clients is not None:
+            return self.clients.get('sheets', 'v4')
+
+        self._api = build_client('sheets', 'v4', self.credentials, self.stats)
         return self._api
 
+    @property
+    def drive_api(self):
+        if self._drive_api is not None:
+            return self._drive_api
+
+        if self.clients is not None:
+            return self.clients.get('drive', 'v3')
+
+        self._drive_api = build_client('drive', 'v3', self.credentials, self.stats)
+        return self._drive_api
+
     @property
     def sheet_data(self):
         if self._sheet_data is not None:
             return self._sheet_data
 
-        api_res = self.api.spreadsheets().values().get(spreadsheetId=self.spreadsheet_id, range=self.sheet_range).execute()
-        self._sheet_data = api_res.get('values', [])
-        self._sheet_headers = self._sheet_data[0]
+        if self.read_cache_ttl:
+            values = read_through(
+                self.spreadsheet_id, self.sheet_name, self.sheet_range, self.read_options, self.read_cache_ttl,
+                self.read_values
+            )
+        else:
+            values = self.read_values()
+
+        # an empty sheet reads back without any row, not even the header
+        self._sheet_headers = values[0] if values else []
         # remove the headers from the data
-        self._sheet_data = self._sheet_data[1:]
+        self._sheet_data = ColumnarSheetData(values[1:]) if self.columnar else values[1:]
 
         return self._sheet_data
 
+    @backoff_on_http_error
+    def read_values(self):
+        """ reads the values of the whole sheet range, header row included
+        :return: `list` of `list` of cell values
+        """
+        api_res = self.api.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id, range=self.sheet_range, fields='values', **self.read_options
+        ).execute()
+
+        return api_res.get('values', [])
+
+    @backoff_on_http_error
+    def read_header_row(self):
+        """ reads only the header row of the sheet range
+        :return: `list` of `str` headers
+        """
+        cols_start, cols_end = self.sheet_range_cols
+        rows_start, rows_end = self.sheet_range_rows
+
+        api_res = self.api.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id, fields='values', **self.read_options,
+            range=BaseSheetInterface.get_sheet_range(self.sheet_name, f'{cols_start}{rows_start}:{cols_end}{rows_start}')
+        ).execute()
+
+        return (api_res.get('values') or [[]])[0]
+
+    @backoff_on_http_error
+    def read_columns(self, column_indexes):
+        """ reads the cells under the header of some columns with one `batchGet`, column by column
+        :param column_indexes: `list` of `int` indexes of columns in the sheet range
+        :return: `list` with the `list` of cell values of each column, in the order of the indexes. Trailing empty
+        cells are left out, like the API does for rows
+        """
+        cols_start, cols_end = self.sheet_range_cols
+        rows_start, rows_end = self.sheet_range_rows
+        col_offset = BaseSheetInterface.convert_col_letter_to_number(cols_start)
+        # like a whole range read, an open-ended data range (like A1:Z) reads the columns to the last row, where
+        # `sheet_range_rows` would cap them at `max_rows`
+        if re.search('[A-Z]+\d+:[A-Z]+$', self.sheet_range):
+            rows_end = ''
+
+        ranges = []
+        for col_ix in column_indexes:
+            col = BaseSheetInterface.convert_col_number_to_letter(col_offset + col_ix)
+            ranges.append(BaseSheetInterface.get_sheet_range(self.sheet_name, f'{col}{rows_start + 1}:{col}{rows_end}'))
+
+        api_res = self.api.spreadsheets().values().batchGet(
+            spreadsheetId=self.spreadsheet_id, ranges=ranges, majorDimension='COLUMNS',
+            fields='valueRanges(values)', **self.read_options
+        ).execute()
+
+        return [(vr.get('values') or [[]])[0] for vr in api_res.get('valueRanges', [])]
+
+    @property
+    def read_options(self):
+        """ the render options to read sheet values with
+        :return: `dict` of kwargs for `values().get` and `values().batchGet`
+        """
+        if not self.typed_values:
+            return {}
+
+        return {'valueRenderOption': 'UNFORMATTED_VALUE', 'dateTimeRenderOption': 'SERIAL_NUMBER'}
+
+    @property
+    def value_plan(self):
+        """ the conversions between sheet values and the model's field values, None unless `typed_values` is set """
+        return get_value_plan(self.model_cls) if self.typed_values else None
+
     @property
     def sheet_headers(self):
         if not self._sheet_headers:
@@ -88,6 +292,42 @@ class BaseSheetInterface(object):
 
         return self._sheet_headers
 
+    def query(self):
+        """ a `SheetQuerySet` to look rows of the sheet up without pulling them into models, with `pk` lookups
+        matching the sheet ID column
+        :return: `SheetQuerySet`
+        """
+        return SheetQuerySet(self.sheet_headers, self.sheet_data, key_column=self.sheet_id_field)
+
+    @property
+    def sheet_id_index(self):
+        """ lazily builds a map of the values in the sheet ID column to the index of the first row holding them, so
+        existing rows can be found without scanning the whole sheet for every instance
+        :return: `dict` of `str` model ID to `int` row index in `sheet_data`
+        :raises: `ValueError` if the columns don't contain the Sheet ID col
+        """
+        if self._sheet_id_index is not None:
+            return self._sheet_id_index
+
+        sheet_id_ix = self.column_index(self.sheet_id_field)
+        self._sheet_id_index = {}
+
+        if isinstance(self.sheet_data, ColumnarSheetData):
+            for i, model_id in enumerate(self.sheet_data.column(sheet_id_ix)):
+                if model_id is not None:
+                    self._sheet_id_index.setdefault(str(model_id), i)
+
+            return self._sheet_id_index
+
+        for i, r in enumerate(self.sheet_data):
+            try:
+                # unformatted reads give numeric IDs as numbers
+                self._sheet_id_index.setdefault(str(r[sheet_id_ix]), i)
+            except IndexError:
+                continue
+
+        return self._sheet_id_index
+
     @property
     def sheet_range(self):
         return BaseSheetInterface.get_sheet_range(self.sheet_name, self.data_range)
@@ -135,6 +375,49 @@ class BaseSheetInterface(object):
     def get_sheet_range(sheet_name, data_range):
         return '!'.join([sheet_name, data_range])
 
+    @property
+    def sheet_snapshot(self):
+        """ identifies the structure of the sheet - its range and header row - so checkpoints are only resumed from
+        when rows are still where they were
+        :return: `str`
+        """
+        structure = '\x1f'.join([self.sheet_range] + [str(h) for h in self.sheet_headers])
+        return hashlib.blake2b(structure.encode('utf-8'), digest_size=16).hexdigest()
+
+    def get_checkpoint_key(self, direction):
+        return dict(model=self.model_cls._meta.label, spreadsheet_id=self.spreadsheet_id, sheet_name=self.sheet_name,
+                    direction=direction)
+
+    def load_checkpoint(self, direction):
+        """ gets the position a previous, unfinished sync in the given direction got to
+        :param direction: `str` 'pull' or 'push'
+        :return: `int` position to resume from, 0 if there's no checkpoint or the sheet's structure changed since
+        """
+        from .models import SyncCheckpoint
+
+        checkpoint = SyncCheckpoint.objects.filter(**self.get_checkpoint_key(direction)).first()
+        if checkpoint is None:
+            return 0
+
+        if checkpoint.snapshot != self.sheet_snapshot:
+            logger.info(f'structure of {self.sheet_range} changed since the last {direction} checkpoint, starting over')
+            return 0
+
+        logger.info(f'resuming {direction} of {self.sheet_range} from position {checkpoint.position}')
+        return checkpoint.position
+
+    def save_checkpoint(self, direction, position):
+        from .models import SyncCheckpoint
+
+        SyncCheckpoint.objects.update_or_create(
+            defaults={'position': position, 'snapshot': self.sheet_snapshot}, **self.get_checkpoint_key(direction)
+        )
+
+    def clear_checkpoint(self, direction):
+        from .models import SyncCheckpoint
+
+        SyncCheckpoint.objects.filter(**self.get_checkpoint_key(direction)).delete()
+
     def column_index(self, field_name):
         """ given a canonical field name (like 'Name'), get the column index of that field in the sheet. This relies
         on the first row in the sheet having a cell with the name of the given field
@@ -146,6 +429,54 @@ class BaseSheetInterface(object):
 
         return self.sheet_headers.index(field_name)
 
+    @property
+    def checksum_column_index(self):
+        """ the index of the checksum column in the sheet
+        :return: `int` or None if no checksum field is configured or the sheet has no header for it
+        """
+        if self.checksum_field is None:
+            return None
+
+        try:
+            return self.column_index(self.checksum_field)
+        except ValueError:
+            logger.warning(f'sheet has no {self.checksum_field} column, row checksums are disabled')
+            return None
+
+    @property
+    def checksum_column_indexes(self):
+        """ the columns row checksums cover: the columns pushes write, which are the model's push fields with the
+        model ID in the sheet ID column and related fields in their lookup columns. Pushes and pulls of the same model
+        both derive them from the model, so columns the model doesn't sync (notes, formulas) never affect a checksum
+        :return: `list` of `int` column indexes, without the checksum column
+        """
+        if self._checksum_column_indexes is None:
+            get_push_fields = getattr(self.model_cls, 'get_sheet_push_fields', None)
+            fields = get_push_fields() if get_push_fields is not None else [f.name for f in self.model_cls._meta.fields]
+            lookup_columns = {lookup.field_name: lookup.column for lookup in self.related_lookups}
+            headers = {self.sheet_id_field if f == self.model_id_field else lookup_columns.get(f, f) for f in fields}
+
+            checksum_ix = self.checksum_column_index
+            self._checksum_column_indexes = [
+                i for i, header in enumerate(self.sheet_headers) if header in headers and i != checksum_ix
+            ]
+
+        return self._checksum_column_indexes
+
+    @staticmethod
+    def row_checksum(row, column_indexes):
+        """ computes the digest of the synced cells of a row as they read back from the sheet, leaving out any
+        trailing empty cells
+        :param row: `list` of cell values
+        :param column_indexes: `list` of `int` indexes of the columns to cover, as given by `checksum_column_indexes`
+        :return: `str`
+        """
+        values = ['' if i >= len(row) or row[i] is None else str(row[i]) for i in column_indexes]
+        while values and values[-1] == '':
+            values.pop()
+
+        return hashlib.blake2b('\x1f'.join(values).encode('utf-8'), digest_size=12).hexdigest()
+
     def existing_row(self, **data):
         """ given the data to be synced to a row, check if it already exists in the sheet and - if it does - return
         its index
@@ -155,19 +486,165 @@ class BaseSheetInterface(object):
         :raises: `ValueError` if the columns don't contain the Sheet ID col
         """
         model_id = data[self.model_id_field]
-        sheet_id_ix = self.column_index(self.sheet_id_field)
 
-        # look through the sheet ID column for the model ID
-        for i, r in enumerate(self.sheet_data):
-            try:
-                if r[sheet_id_ix] == str(model_id):
-                    return i
-            except IndexError:
-                continue
+        return self.sheet_id_index.get(str(model_id))
+
+    def add_sheet_row(self, model_id, row_data):
+        """ adds a new row to the end of the in-memory sheet data, keeping the sheet ID index up to date
+        :param model_id: the ID of the model instance the row belongs to
+        :param row_data: `list` of cell values
+        """
+        self.sheet_data.append(row_data)
+        self.sheet_id_index.setdefault(str(model_id), len(self.sheet_data) - 1)
+
+    @backoff_on_http_error
+    def get_spreadsheet_revision(self):
+        """ gets the current revision of the spreadsheet from its Drive file metadata. The revision changes whenever
+        anything in the spreadsheet changes. Requires a Drive metadata scope (like
+        'https://www.googleapis.com/auth/drive.metadata.readonly') in the `SCOPES` setting
+        :return: `str`
+        :raises: `ImproperlyConfigured` if Drive denies access to the file metadata, usually for lack of that scope
+        """
+        from googleapiclient.errors import HttpError
+
+        try:
+            api_res = self.drive_api.files().get(fileId=self.spreadsheet_id, fields='version').execute()
+        except HttpError as e:
+            if get_error_status(e) != 403 or is_rate_limit_error(e):
+                raise
 
-        return None
+            # retrying won't grant the missing permission
+            raise ImproperlyConfigured(
+                f'Drive denied reading the revision of spreadsheet {self.spreadsheet_id}. Skipping unchanged pulls needs '
+                f'the https://www.googleapis.com/auth/drive.metadata.readonly scope in the SCOPES setting, re-authorize '
+                f'after adding it'
+            ) from e
 
-    @decorators.backoff_on_exception(decorators.expo, HttpError)
+        return api_res['version']
+
+    @property
+    def grid_sheet_id(self):
+        """ the numeric ID of the sheet, which `spreadsheets.batchUpdate` requests address sheets by """
+        if self._grid_sheet_id is None:
+            self._grid_sheet_id = self.get_grid_sheet_id()
+
+        return self._grid_sheet_id
+
+    @backoff_on_http_error
+    def get_grid_sheet_id(self):
+        """ looks up the numeric ID of the sheet from the spreadsheet's metadata
+        :return: `int`
+        :raises: `ValueError` if the spreadsheet has no sheet named `sheet_name`
+        """
+        api_res = self.api.spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id, fields='sheets.properties(sheetId,title)'
+        ).execute()
+
+        for sheet in api_res.get('sheets', []):
+            if sheet['properties']['title'] == self.sheet_name:
+                return sheet['properties']['sheetId']
+
+        raise ValueError(f'spreadsheet {self.spreadsheet_id} has no sheet named {self.sheet_name}')
+
+    @staticmethod
+    def get_cell_data(value):
+        """ converts a cell value to the `CellData` of an `updateCells` request. Values are stored as they are, only
+        strings starting with '=' are entered as formulas
+        :param value: cell value, None to clear the cell
+        :return: `dict`
+        """
+        if value is None:
+            return {}
+        if isinstance(value, bool):
+            return {'userEnteredValue': {'boolValue': value}}
+        if isinstance(value, (int, float, Decimal)):
+            return {'userEnteredValue': {'numberValue': float(value) if isinstance(value, Decimal) else value}}
+
+        value = str(value)
+        if value.startswith('='):
+            return {'userEnteredValue': {'formulaValue': value}}
+
+        return {'userEnteredValue': {'stringValue': value}}
+
+    def writeout_cells(self, cells):
+        """ writes scattered cells, like IDs of created instances or the changed cells of pushed rows, with as few
+        `spreadsheets.batchUpdate` requests as possible. Adjacent cells of a row are sent as one `updateCells` request,
+        and each API request holds up to `SPARSE_WRITE_MAX_CELLS` cells
+        :param cells: `list` of `three-tuple` of the row index in the sheet data, the column index in the data range and
+        the cell value
+        """
+        rows_start, rows_end = self.sheet_range_rows
+        cols_start, cols_end = self.sheet_range_cols
+        # the header is grid row rows_start - 1, so data row 0 is grid row rows_start
+        col_offset = BaseSheetInterface.convert_col_letter_to_number(cols_start)
+
+        runs = []
+        for row_ix, col_ix, value in sorted(cells, key=lambda cell: (cell[0], cell[1])):
+            last_row_ix, last_col_ix, run_values = runs[-1] if runs else (None, None, None)
+            if row_ix == last_row_ix and col_ix == last_col_ix + len(run_values):
+                run_values.append(value)
+            else:
+                runs.append((row_ix, col_ix, [value]))
+
+        requests, request_cells = [], 0
+        for row_ix, col_ix, values in runs:
+            requests.append({'updateCells': {
+                'start': {
+                    'sheetId': self.grid_sheet_id, 'rowIndex': rows_start + row_ix, 'columnIndex': col_offset + col_ix
+                },
+                'rows': [{'values': [BaseSheetInterface.get_cell_data(v) for v in values]}],
+                'fields': 'userEnteredValue'
+            }})
+            request_cells += len(values)
+
+            if request_cells >= SPARSE_WRITE_MAX_CELLS:
+                self.writeout_grid_requests(requests)
+                requests, request_cells = [], 0
+
+        if requests:
+            self.writeout_grid_requests(requests)
+
+    def writeout_appended_rows(self, rows):
+        """ appends rows after the last row holding data in the sheet with `appendCells` requests, converting cells
+        with `get_cell_data` like `writeout_cells` does, so appended and rewritten cells of a column are stored alike.
+        Each API request holds up to `SPARSE_WRITE_MAX_CELLS` cells
+        :param rows: `list` of `list` of cell values, starting at the first column of the data range
+        """
+        cols_start, cols_end = self.sheet_range_cols
+        # appendCells rows start at the sheet's first column, pad them up to the data range
+        padding = [{}] * BaseSheetInterface.convert_col_letter_to_number(cols_start)
+
+        chunk, chunk_cells = [], 0
+        for row in rows:
+            chunk.append({'values': padding + [BaseSheetInterface.get_cell_data(v) for v in row]})
+            chunk_cells += len(row)
+
+            if chunk_cells >= SPARSE_WRITE_MAX_CELLS:
+                self.writeout_grid_requests([
+                    {'appendCells': {'sheetId': self.grid_sheet_id, 'rows': chunk, 'fields': 'userEnteredValue'}}
+                ])
+                chunk, chunk_cells = [], 0
+
+        if chunk:
+            self.writeout_grid_requests([
+                {'appendCells': {'sheetId': self.grid_sheet_id, 'rows': chunk, 'fields': 'userEnteredValue'}}
+            ])
+
+    @backoff_on_http_error
+    def writeout_grid_requests(self, requests):
+        """ sends `spreadsheets.batchUpdate` requests, which are applied atomically
+        :param requests: `list` of `dict` requests, like `updateCells`
+        """
+        logger.debug(f'sending {len(requests)} grid requests to {self.spreadsheet_id}')
+
+        response = self.api.spreadsheets().batchUpdate(
+            spreadsheetId=self.spreadsheet_id, body={'requests': requests}, fields='spreadsheetId'
+        ).execute()
+        invalidate_sheet(self.spreadsheet_id, self.sheet_name)
+
+        return response
+
+    @backoff_on_http_error
     def writeout(self, range, data):
         """ writes the given data to the given range in the spreadsheet (without batching)
         :param range: `str` a range (like 'Sheet1!A2:B3') to write data to
@@ -177,11 +654,15 @@ class BaseSheetInterface(object):
             'values': data
         }
 
-        return self.api.spreadsheets().values().update(
-            spreadsheetId=self.spreadsheet_id, range=range, valueInputOption='USER_ENTERED', body=body
+        response = self.api.spreadsheets().values().update(
+            spreadsheetId=self.spreadsheet_id, range=range, valueInputOption='USER_ENTERED', body=body,
+            includeValuesInResponse=False, fields='updatedCells'
         ).execute()
+        invalidate_sheet(self.spreadsheet_id, self.sheet_name)
 
-    @decorators.backoff_on_exception(decorators.expo, HttpError)
+        return response
+
+    @backoff_on_http_error
     def writeout_batch(self, ranges, data):
         """ writes the given data to the given ranges in the spreadsheet
         :param ranges: `list` of `str` ranges (like 'Sheet1!A2:B3') to write data to
@@ -194,11 +675,15 @@ class BaseSheetInterface(object):
         request_data = zip(ranges, data)
         request_body = {
             'value_input_option': 'USER_ENTERED',
+            'include_values_in_response': False,
             'data': [{'range': r, 'values': values} for r, values in request_data]
         }
 
-        request = self.api.spreadsheets().values().batchUpdate(spreadsheetId=self.spreadsheet_id, body=request_body)
+        request = self.api.spreadsheets().values().batchUpdate(
+            spreadsheetId=self.spreadsheet_id, body=request_body, fields='totalUpdatedCells'
+        )
         response = request.execute()
+        invalidate_sheet(self.spreadsheet_id, self.sheet_name)
 
         logger.debug(f'got response {response} executing writeout in range {range}')
 
@@ -211,48 +696,209 @@ class SheetPushInterface(BaseSheetInterface):
         super(SheetPushInterface, self).__init__(*args, **kwargs)
         self.queryset = kwargs.pop('queryset')
         self.push_fields = kwargs.pop('push_fields', [f.name for f in self.model_cls._meta.fields])
+        self.append_new_rows = kwargs.pop('append_new_rows', False)
+        self.append_batch_size = kwargs.pop('append_batch_size', None) or self.batch_size
+        # the max number of batches waiting to be written by a background writer while the next ones are built, 0 to
+        # write each batch before building the next
+        self.push_pipeline_depth = kwargs.pop('push_pipeline_depth', 0)
+        # read only the header row, the sheet ID column and the checksum column instead of the whole sheet. Existing
+        # rows are rewritten blind, unless their checksum shows they're unchanged
+        self.id_column_only = kwargs.pop('id_column_only', False)
+
+        self._row_checksums = None
+        self._sheet_row_count = 0
+
+    @property
+    def sheet_headers(self):
+        if self.id_column_only and not self._sheet_headers:
+            self._sheet_headers = self.read_header_row()
+
+        return super(SheetPushInterface, self).sheet_headers
+
+    @property
+    def sheet_id_index(self):
+        if self.id_column_only and self._sheet_id_index is None:
+            self.read_key_columns()
+
+        return super(SheetPushInterface, self).sheet_id_index
+
+    def read_key_columns(self):
+        """ reads the sheet ID column, and the checksum column if there's one, to index the existing rows without
+        downloading the rest of the sheet
+        """
+        column_indexes = [self.column_index(self.sheet_id_field)]
+        checksum_ix = self.checksum_column_index
+        if checksum_ix is not None:
+            column_indexes.append(checksum_ix)
+
+        columns = self.read_columns(column_indexes)
+        model_ids = columns[0]
+
+        self._sheet_id_index = {}
+        for i, model_id in enumerate(model_ids):
+            if model_id not in (None, ''):
+                self._sheet_id_index.setdefault(str(model_id), i)
+
+        self._sheet_row_count = len(model_ids)
+        self._row_checksums = columns[1] if checksum_ix is not None else None
+        logger.debug(f'indexed {len(self._sheet_id_index)} rows of {self.sheet_range} from its ID column')
+
+    def add_sheet_row(self, model_id, row_data):
+        if not self.id_column_only:
+            return super(SheetPushInterface, self).add_sheet_row(model_id, row_data)
+
+        self.sheet_id_index.setdefault(str(model_id), self._sheet_row_count)
+        self._sheet_row_count += 1
+
+    def projected_row_cells(self, row_ix, row_data):
+        """ gets the cells to write to an existing row when only the key columns were read: every pushed cell, or
+        none when the row's checksum in the sheet shows it's unchanged
+        :param row_ix: `int` index of the row in the sheet
+        :param row_data: `list` of cell values to push, as built by `get_row_data`
+        :return: `list` of `three-tuple` of row index, column index and value
+        """
+        checksum_ix = self.checksum_column_index
+        if self._row_checksums is not None and checksum_ix is not None and row_ix < len(self._row_checksums):
+            if str(self._row_checksums[row_ix]) == str(row_data[checksum_ix]):
+                return []
+
+        return [(row_ix, i, value) for i, value in enumerate(row_data) if value is not None]
+
+    @property
+    def push_queryset(self):
+        """ the queryset to push, joining in the related objects needed to render related lookup columns """
+        if self.related_lookups and hasattr(self.queryset, 'select_related'):
+            return self.queryset.select_related(*[lookup.select_related for lookup in self.related_lookups])
+
+        return self.queryset
+
+    def get_push_data(self, obj):
+        """ gets the dict of field/values to push for a model instance. Related fields with a lookup are pushed as
+        the lookup value in the lookup column
+        :param obj: model instance
+        :return: `dict`
+        """
+        push_data = {f: getattr(obj, f) for f in self.push_fields}
+
+        for lookup in self.related_lookups:
+            push_data.pop(lookup.field_name, None)
+            push_data[lookup.column] = lookup.render(getattr(obj, lookup.field_name))
+
+        return push_data
 
     def upsert_table(self):
-        """ upserts objects of this instance type to Sheets """
-        queryset = self.queryset
-        last_writeout = 0
-        cols_start, cols_end = self.sheet_range_cols
-        rows_start, rows_end = self.sheet_range_rows
+        """ upserts objects of this instance type to Sheets, rewriting every pushed row. Rows that don't exist in the
+        sheet yet are appended, and the cells of existing rows are written with `updateCells` in batches of
+        `batch_size` rows, stored as they are like `append_table` stores them
+        """
+        if self.append_new_rows or self.id_column_only:
+            return self.append_table()
 
-        for i, obj in enumerate(queryset):
-            if i > 0 and i % self.batch_size == 0:
-                writeout_range_start_row = (rows_start + 1) + last_writeout
-                writeout_range_end_row = writeout_range_start_row + self.batch_size
-                writeout_range = BaseSheetInterface.get_sheet_range(
-                    self.sheet_name, f'{cols_start}{writeout_range_start_row}:{cols_end}{writeout_range_end_row}'
-                )
+        row_cells, new_rows = [], []
+        rewritten_rows = 0
 
-                writeout_data_start_row = (rows_start - 1) + last_writeout
-                writeout_data_end_row = writeout_data_start_row + self.batch_size
-                writeout_data = self.sheet_data[writeout_data_start_row:writeout_data_end_row]
+        # read the sheet before the writer starts, so only the writer talks to the API while batches are written
+        self.sheet_id_index
 
-                logger.debug(f'writing out {len(writeout_data)} rows of data to {writeout_range}')
+        with BackgroundWriter(self.push_pipeline_depth) as writer:
+            for obj in self.push_queryset:
+                push_data = self.get_push_data(obj)
+                row_data = self.get_row_data(**push_data)
+                existing_row_ix = self.existing_row(**push_data)
 
-                self.writeout_batch([writeout_range], [writeout_data])
-                last_writeout = i
+                if existing_row_ix is None:
+                    new_rows.append(row_data)
+                    self.add_sheet_row(push_data[self.model_id_field], row_data)
+                else:
+                    row_cells += [(existing_row_ix, i, value) for i, value in enumerate(row_data) if value is not None]
+                    rewritten_rows += 1
+                    self.sheet_data[existing_row_ix] = row_data
 
-            push_data = {f: getattr(obj, f) for f in self.push_fields}
-            self.upsert_sheet_data(**push_data)
+                if len(new_rows) + rewritten_rows >= self.batch_size:
+                    writer.submit(self.writeout_rows, new_rows, row_cells)
+                    row_cells, new_rows = [], []
+                    rewritten_rows = 0
 
-        # writeout any remaining data
-        if last_writeout < len(queryset):
-            logger.debug(f'writing out {len(queryset) - last_writeout} final rows of data')
-            writeout_range = BaseSheetInterface.get_sheet_range(
-                self.sheet_name, f'{cols_start}{max(2, last_writeout)}:{cols_end}{rows_end}'
-            )
-            self.writeout_batch([writeout_range], [self.sheet_data[last_writeout:]])
+            writer.submit(self.writeout_rows, new_rows, row_cells)
 
         logger.info('FINISHED WITH TABLE UPSERT')
 
-    def upsert_sheet_data(self, **data):
-        """ upserts the data, given as a dict of field/values, to the sheet. If the data already exists, replaces
-        its previous value
+    def append_table(self):
+        """ upserts objects of this instance type to Sheets without rewriting the whole table. Rows that don't exist
+        in the sheet yet are appended with `appendCells` in batches of `append_batch_size`, and only the changed cells
+        of existing rows are rewritten
+        """
+        changed_cells, new_rows = [], []
+        changed_rows = 0
+        queryset = self.push_queryset
+        position = 0
+
+        if self.resumable:
+            # resuming skips instances by position, which needs a stable order
+            if hasattr(queryset, 'ordered') and not queryset.ordered:
+                queryset = queryset.order_by('pk')
+
+            position = self.load_checkpoint('push')
+            queryset = queryset[position:]
+
+        # read the sheet before the writer starts, so only the writer talks to the API while batches are written
+        self.sheet_id_index
+
+        with BackgroundWriter(self.push_pipeline_depth) as writer:
+            for i, obj in enumerate(queryset, start=position):
+                push_data = self.get_push_data(obj)
+                row_data = self.get_row_data(**push_data)
+                existing_row_ix = self.existing_row(**push_data)
+
+                if existing_row_ix is None:
+                    new_rows.append(row_data)
+                    self.add_sheet_row(push_data[self.model_id_field], row_data)
+                elif self.id_column_only:
+                    row_cells = self.projected_row_cells(existing_row_ix, row_data)
+                    if row_cells:
+                        changed_cells += row_cells
+                        changed_rows += 1
+                else:
+                    row_cells = self.changed_cells(existing_row_ix, self.sheet_data[existing_row_ix], row_data)
+                    if row_cells:
+                        changed_cells += row_cells
+                        changed_rows += 1
+                        self.sheet_data[existing_row_ix] = row_data
+
+                if len(new_rows) >= self.append_batch_size or changed_rows >= self.batch_size:
+                    writer.submit(self.writeout_rows, new_rows, changed_cells)
+                    changed_cells, new_rows = [], []
+                    changed_rows = 0
+
+                    if self.resumable:
+                        # queued behind the writeout, so the checkpoint is only saved once the batch is in the sheet
+                        writer.submit(self.save_checkpoint, 'push', i + 1)
+
+            writer.submit(self.writeout_rows, new_rows, changed_cells)
+
+        if self.resumable:
+            self.clear_checkpoint('push')
+
+        logger.info('FINISHED WITH TABLE APPEND')
+
+    def writeout_rows(self, new_rows, changed_cells):
+        """ appends new rows to the table and rewrites the changed cells of existing rows
+        :param new_rows: `list` of `list` rows to append
+        :param changed_cells: `list` of `three-tuple` changed cells, as given by `changed_cells`
+        """
+        if len(new_rows) > 0:
+            logger.debug(f'appending {len(new_rows)} new rows to {self.sheet_range}')
+            self.writeout_appended_rows(new_rows)
+
+        if len(changed_cells) > 0:
+            logger.debug(f'rewriting {len(changed_cells)} changed cells')
+            self.writeout_cells(changed_cells)
+
+    def get_row_data(self, **data):
+        """ builds the row of cell values for the data, given as a dict of field/values, with each value placed at
+        the column index of its header. Columns without a pushed field are left as `None` so the API skips them
         :param data: `dict` of field/value
+        :return: `list` of cell values
         """
         field_indexes = []
         for field in data.keys():
@@ -261,20 +907,54 @@ class SheetPushInterface(BaseSheetInterface):
             except ValueError:
                 logger.info(f'skipping field {field} because it has no header')
 
-        # order the field indexes by their col index
-        sorted_field_indexes = sorted(field_indexes, key=lambda x: x[1])
+        if not field_indexes:
+            return []
 
-        row_data = []
-        for field, ix in sorted_field_indexes:
+        value_plan = self.value_plan
+        row_data = [None] * (max(ix for noop, ix in field_indexes) + 1)
+        for field, ix in field_indexes:
             logger.debug(f'writing data in field {field} to col ix {ix}')
-            row_data.append(data[field])
+            row_data[ix] = value_plan.serialize(data[field]) if value_plan is not None else data[field]
+
+        checksum_ix = self.checksum_column_index
+        if checksum_ix is not None:
+            row_data += [None] * (checksum_ix + 1 - len(row_data))
+            row_data[checksum_ix] = BaseSheetInterface.row_checksum(row_data, self.checksum_column_indexes)
+
+        return row_data
+
+    @staticmethod
+    def changed_cells(row_ix, sheet_row, row_data):
+        """ finds the cells of a row that would change if the row were pushed
+        :param row_ix: `int` index of the row in the sheet data
+        :param sheet_row: `list` of cell values read from the sheet, formatted or not
+        :param row_data: `list` of cell values to push, as built by `get_row_data`
+        :return: `list` of `three-tuple` of row index, column index and value of the changed cells
+        """
+        cells = []
+        for i, value in enumerate(row_data):
+            if value is None:
+                continue
+
+            current = sheet_row[i] if i < len(sheet_row) else ''
+            if not cell_holds_value(current, value):
+                cells.append((row_ix, i, value))
+
+        return cells
+
+    def upsert_sheet_data(self, **data):
+        """ upserts the data, given as a dict of field/values, to the sheet. If the data already exists, replaces
+        its previous value
+        :param data: `dict` of field/value
+        """
+        row_data = self.get_row_data(**data)
 
         # get the row to update if it exists, otherwise we will add a new row
         existing_row_ix = self.existing_row(**data)
         if existing_row_ix is not None:
             self.sheet_data[existing_row_ix] = row_data
         else:
-            self.sheet_data.append(row_data)
+            self.add_sheet_row(data[self.model_id_field], row_data)
 
 
 class SheetPullInterface(BaseSheetInterface):
@@ -286,47 +966,419 @@ class SheetPullInterface(BaseSheetInterface):
     def __init__(self, *args, **kwargs):
         super(SheetPullInterface, self).__init__(*args, **kwargs)
         self.pull_fields = kwargs.pop('pull_fields', 'all')
+        self.skip_unchanged = kwargs.pop('skip_unchanged', False)
+        self.column_cleaner_backend = kwargs.pop('column_cleaner_backend', None)
+        self.pull_processes = kwargs.pop('pull_processes', None)
+        self.failed_row_policy = kwargs.pop('failed_row_policy', 'raise')
+        # queryset filter scoping the instances this sheet holds, like {'customer_id': 4} for a customer's spreadsheet
+        self.queryset_filter = kwargs.pop('queryset_filter', None) or {}
+        # `BaseShardStrategy` of a sharded model, so rows left in a shard by instances that moved aren't pulled back
+        self.shard_strategy = kwargs.pop('shard_strategy', None)
+        if self.failed_row_policy not in ('raise', 'skip'):
+            raise ImproperlyConfigured(f'unknown failed row policy {self.failed_row_policy}, use "raise" or "skip"')
+
+        # `two-tuple`s of row index and exception for rows skipped by the 'skip' failed row policy
+        self.failed_rows = []
+
+        self._model_fields = None
+        self._cell_cleaners = {}
+        self._revision = None
 
-    def pull_sheet(self):
+    @property
+    def pull_field_indexes(self):
+        """ the sheet columns to pull
+        :return: `dict` of `int` column index to `str` field name
+        """
         sheet_fields = self.pull_fields
+        return {self.column_index(f): f for f in self.sheet_headers if f in sheet_fields or sheet_fields == 'all'}
+
+    @property
+    def sheet_data(self):
+        if self._sheet_data is None and self.pulls_selected_columns:
+            rows = self.read_selected_columns()
+            self._sheet_data = ColumnarSheetData(rows) if self.columnar else rows
+
+        return super(SheetPullInterface, self).sheet_data
+
+    @property
+    def pulls_selected_columns(self):
+        """ whether to download only the pulled columns rather than the whole sheet. Row checksums cover every cell of
+        a row, so sheets with a checksum column are always read whole
+        :return: `bool`
+        """
+        return self.pull_fields != 'all' and self.checksum_field is None
+
+    def read_selected_columns(self):
+        """ reads the header row, then only the columns of the pulled fields with one `batchGet`. Sets the sheet
+        headers as a side effect
+        :return: `list` of `list` rows under the header, with the pulled cells at their sheet column index and `None`
+        in the columns that weren't read
+        """
+        self._sheet_headers = self.read_header_row()
+        column_indexes = sorted(self.pull_field_indexes) if self._sheet_headers else []
+        if not column_indexes:
+            return []
+
+        columns = self.read_columns(column_indexes)
+        rows = [[None] * (column_indexes[-1] + 1) for noop in range(max(len(cells) for cells in columns))]
+        for col_ix, cells in zip(column_indexes, columns):
+            for row_ix, cell in enumerate(cells):
+                rows[row_ix][col_ix] = cell
+
+        for row in rows:
+            # like the API does for whole rows, drop trailing cells nobody read, and read empty cells as ''
+            while row and row[-1] is None:
+                row.pop()
+            for col_ix in column_indexes:
+                if col_ix < len(row) and row[col_ix] is None:
+                    row[col_ix] = ''
+
+        logger.debug(f'read {len(column_indexes)} of {len(self._sheet_headers)} columns of {self.sheet_range}')
+
+        return rows
+
+    def pull_sheet(self):
+        if self.skip_unchanged and self.sheet_unchanged():
+            logger.info(f'skipping pull of {self.sheet_range}, spreadsheet unchanged since revision {self._revision}')
+            return []
+
+        field_indexes = self.pull_field_indexes
+        unchanged_rows = self.unchanged_row_indexes(self.sheet_data)
+        instances = []
+        position = 0
+
+        if self.resumable:
+            position = self.load_checkpoint('pull')
+            if position > len(self.sheet_data):
+                logger.info(f'{self.sheet_range} has fewer rows than the pull checkpoint, starting over')
+                position = 0
+
+        batches = self.iter_sheet_batches(unchanged_rows, start=position)
+        for batch_end, prepared in self.prepare_batches(batches, field_indexes):
+            instances += self.upsert_batch(prepared)
+
+            # checkpoint once the batch committed and its IDs are in the sheet, so a resumed pull never re-creates them
+            if self.resumable:
+                self.save_checkpoint('pull', batch_end)
+
+        if self.resumable:
+            self.clear_checkpoint('pull')
+
+        if self._revision is not None:
+            # record the revision read before the download: if the pull itself wrote IDs back, or someone edited the
+            # sheet meanwhile, the next pull downloads it once more instead of missing changes
+            self.record_pulled_revision(self._revision)
+
+        return instances
+
+    def sheet_unchanged(self):
+        """ checks whether the spreadsheet is still at the revision recorded by the last pull. The revision is only
+        fetched once per interface, before the sheet data is downloaded
+        :return: `bool`
+        """
+        if self._revision is None:
+            self._revision = self.get_spreadsheet_revision()
+
+        return self._revision == self.last_pulled_revision
+
+    def prefetch(self):
+        """ downloads the sheet data ahead of `pull_sheet`, unless the pull is going to be skipped """
+        if self.skip_unchanged and self.sheet_unchanged():
+            return
+
+        logger.debug(f'prefetched {len(self.sheet_data)} rows of {self.sheet_range}')
+
+    def iter_sheet_batches(self, skip_rows=(), start=0):
+        """ splits the sheet data into batches of `batch_size` rows
+        :param skip_rows: `set` of `int` row indexes to leave out of the batches
+        :param start: `int` index of the row to start from
+        :return: generator of `two-tuple` of the index of the row following the batch and the batch, a `list` of
+        `two-tuple` of the row index in the sheet data and the row
+        """
+        for batch_start in range(start, len(self.sheet_data), self.batch_size):
+            batch_rows = self.sheet_data[batch_start:batch_start + self.batch_size]
+            batch = [(batch_start + i, row) for i, row in enumerate(batch_rows) if batch_start + i not in skip_rows]
+
+            yield batch_start + len(batch_rows), batch
+
+    def prepare_batches(self, batches, field_indexes):
+        """ prepares batches of sheet rows for upsert, in this process or - when `pull_processes` is set - in a pool
+        of worker processes. Prepared batches are yielded in the order of the given batches, with a bounded number of
+        batches in flight so DB writes in this process overlap with preparation in the workers
+        :param batches: iterable of batches as given by `iter_sheet_batches`
+        :param field_indexes: `dict` of column index to field name, as given by `pull_field_indexes`
+        :return: generator of `two-tuple` of the index of the row following the batch and the prepared batch, as given
+        by `prepare_batch`
+        """
+        if not self.pull_processes:
+            for batch_end, batch in batches:
+                yield batch_end, self.prepare_batch(batch, field_indexes)
+            return
+
+        model_label = self.model_cls._meta.label
+        worker_kwargs = self.get_worker_kwargs()
+        # spawned workers set Django up from scratch instead of sharing this process' DB connections
+        pool = multiprocessing.get_context('spawn').Pool(processes=self.pull_processes, initializer=init_pull_worker)
+
+        try:
+            in_flight = deque()
+
+            for batch_end, batch in batches:
+                result = pool.apply_async(prepare_batch_in_worker, (model_label, worker_kwargs, batch, field_indexes))
+                in_flight.append((batch_end, result))
+
+                if len(in_flight) >= self.pull_processes * 2:
+                    batch_end, result = in_flight.popleft()
+                    yield batch_end, result.get()
+
+            while in_flight:
+                batch_end, result = in_flight.popleft()
+                yield batch_end, result.get()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def get_worker_kwargs(self):
+        """ the kwargs needed to rebuild this interface in a worker process for `prepare_batch` """
+        return dict(
+            sheet_name=self.sheet_name, data_range=self.data_range, model_id_field=self.model_id_field,
+            sheet_id_field=self.sheet_id_field, batch_size=self.batch_size, typed_values=self.typed_values,
+            pull_fields=self.pull_fields, column_cleaner_backend=self.column_cleaner_backend
+        )
+
+    def unchanged_row_indexes(self, rows):
+        """ finds the rows whose checksum cell still matches the digest of their synced values, meaning nobody edited
+        them since they were last pushed
+        :param rows: `list` of `list` of cell values
+        :return: `set` of `int` row indexes, empty if no checksum field is configured
+        """
+        checksum_ix = self.checksum_column_index
+        if checksum_ix is None:
+            return set()
+
+        row_checksum = BaseSheetInterface.row_checksum
+        column_indexes = self.checksum_column_indexes
+        unchanged = {
+            i for i, row in enumerate(rows)
+            if len(row) > checksum_ix and row[checksum_ix] == row_checksum(row, column_indexes)
+        }
+
+        logger.debug(f'{len(unchanged)} of {len(rows)} rows are unchanged since they were last pushed')
+
+        return unchanged
+
+    @property
+    def last_pulled_revision(self):
+        """ the spreadsheet revision recorded by the last successful pull of this model's sheet
+        :return: `str` or None if the sheet hasn't been pulled with `skip_unchanged` yet
+        """
+        from .models import SheetRevision
+
+        return SheetRevision.objects.filter(
+            model=self.model_cls._meta.label, spreadsheet_id=self.spreadsheet_id, sheet_name=self.sheet_name
+        ).values_list('revision', flat=True).first()
+
+    def record_pulled_revision(self, revision):
+        from .models import SheetRevision
+
+        SheetRevision.objects.update_or_create(
+            model=self.model_cls._meta.label, spreadsheet_id=self.spreadsheet_id, sheet_name=self.sheet_name,
+            defaults={'revision': revision}
+        )
+
+    def pull_rows(self, row_numbers):
+        """ pulls only the given rows of the sheet - like the rows listed in an edit notification - instead of the
+        whole sheet
+        :param row_numbers: `list` of `int` row numbers as shown in the sheet (the header row being `rows_start`)
+        :return: `list` of upserted model instances
+        """
+        rows_start, rows_end = self.sheet_range_rows
+        row_numbers = sorted({int(n) for n in row_numbers if rows_start < int(n) <= rows_end})
+        instances = []
+        # every row is its own range in the batchGet query string, keep the request URL reasonably short
+        chunk_size = min(self.batch_size, 100)
+
+        for chunk_start in range(0, len(row_numbers), chunk_size):
+            chunk = row_numbers[chunk_start:chunk_start + chunk_size]
+            rows = self.read_rows(chunk)
+            # a cleared row reads back without cells, it mustn't turn into a new blank instance
+            batch = [(row_num - rows_start - 1, row) for row_num, row in zip(chunk, rows) if any(c != '' for c in row)]
+
+            instances += self.pull_batch(batch, self.pull_field_indexes)
+
+        return instances
+
+    @backoff_on_http_error
+    def read_rows(self, row_numbers):
+        """ reads the header row and the given rows of the sheet in one request. Sets the sheet headers as a side
+        effect
+        :param row_numbers: `list` of `int` row numbers as shown in the sheet
+        :return: `list` of `list` of cell values, one per row number
+        """
+        cols_start, cols_end = self.sheet_range_cols
         rows_start, rows_end = self.sheet_range_rows
-        field_indexes = {self.column_index(f): f for f in self.sheet_headers if f in sheet_fields or sheet_fields == 'all'}
+        ranges = [
+            BaseSheetInterface.get_sheet_range(self.sheet_name, f'{cols_start}{n}:{cols_end}{n}')
+            for n in [rows_start] + list(row_numbers)
+        ]
+
+        api_res = self.api.spreadsheets().values().batchGet(
+            spreadsheetId=self.spreadsheet_id, ranges=ranges, fields='valueRanges(values)', **self.read_options
+        ).execute()
+        rows = [(vr.get('values') or [[]])[0] for vr in api_res.get('valueRanges', [])]
+        self._sheet_headers = rows[0]
+
+        return rows[1:]
+
+    def pull_batch(self, batch, field_indexes):
+        """ cleans and upserts a batch of sheet rows
+        :param batch: `list` of `two-tuple` of the row index in the sheet data (not counting the header) and the row
+        :param field_indexes: `dict` of column index to field name, as given by `pull_field_indexes`
+        :return: `list` of upserted model instances
+        """
+        return self.upsert_batch(self.prepare_batch(batch, field_indexes))
+
+    def upsert_batch(self, prepared):
+        """ upserts a prepared batch of sheet rows in a single transaction, resolving related lookups with one query
+        per lookup, then - once the transaction committed - writes the IDs of created instances back to the sheet.
+        With the 'raise' failed row policy a failing row rolls the whole batch back and the error propagates, with
+        'skip' each row gets a savepoint and failing rows are logged, recorded in `failed_rows` and left out
+        :param prepared: `list` of prepared rows as given by `prepare_batch`
+        :return: `list` of upserted model instances
+        """
         instances = []
+        created_flags = []
+        batch_data = []
         writeout_batch = []
 
-        for row_ix, row in enumerate(self.sheet_data):
-            if len(writeout_batch) >= self.batch_size:
-                logger.debug('writing out a batch of instance IDs')
-                self.writeout_created_instance_ids(writeout_batch)
-                writeout_batch = []
+        for lookup in self.related_lookups:
+            lookup.resolve_batch([(row_data, cleaned_data) for noop, row_data, cleaned_data in prepared])
+
+        with transaction.atomic(using=router.db_for_write(self.model_cls)):
+            for row_ix, row_data, cleaned_data in prepared:
+                if self.failed_row_policy == 'skip':
+                    try:
+                        with transaction.atomic(using=router.db_for_write(self.model_cls)):
+                            instance, created = self.save_model_data(row_ix, row_data, cleaned_data)
+                    except Exception as e:
+                        logger.exception(f'skipping row {row_ix} which failed to upsert')
+                        self.failed_rows.append((row_ix, e))
+                        continue
+                else:
+                    instance, created = self.save_model_data(row_ix, row_data, cleaned_data)
+
+                if instance is None:
+                    continue
+
+                instances.append(instance)
+                created_flags.append(created)
+                batch_data.append(row_data)
+                if created:
+                    writeout_batch.append((instance, row_ix))
+
+            if len(instances) > 0:
+                sheet_rows_processed.send(sender=self.model_cls, instances=instances, created=created_flags, row_data=batch_data)
+
+        if len(writeout_batch) > 0:
+            logger.debug(f'writing out {len(writeout_batch)} instance IDs')
+            self.writeout_created_instance_ids(writeout_batch)
+
+        return instances
+
+    def prepare_batch(self, batch, field_indexes):
+        """ turns a batch of sheet rows into the data to upsert, converting typed values, running the model's column
+        cleaners over the whole batch and then its `clean_row_data`, `should_upsert_row` and `clean_<field>_data` hooks
+        over each row. Doesn't touch the DB or the API, so it can run in a worker process
+        :param batch: `list` of `two-tuple` of the row index in the sheet data (not counting the header) and the row
+        :param field_indexes: `dict` of column index to field name, as given by `pull_field_indexes`
+        :return: `list` of `three-tuple` of the row index, the `dict` of row data and the `dict` of cleaned model
+        data, without the rows the model prevented from being upserted
+        """
+        batch_data = [
+            (row_ix, {field_indexes[col_ix]: value for col_ix, value in enumerate(row) if col_ix in field_indexes})
+            for row_ix, row in batch
+        ]
 
-            row_data = {}
+        value_plan = self.value_plan
+        if value_plan is not None:
+            for noop, row_data in batch_data:
+                value_plan.parse_row(row_data)
 
-            for col_ix in range(len(row)):
-                if col_ix in field_indexes:
-                    field = field_indexes[col_ix]
-                    value = row[col_ix]
+        self.clean_columns([row_data for noop, row_data in batch_data])
 
-                    row_data[field] = value
+        clean_row_data = getattr(self.model_cls, 'clean_row_data', None)
+        should_upsert_row = getattr(self.model_cls, 'should_upsert_row', None)
+        prepared = []
 
-            cleaned_row_data = getattr(self.model_cls, 'clean_row_data')(row_data) if hasattr(self.model_cls, 'clean_row_data') else row_data
+        for row_ix, row_data in batch_data:
+            cleaned_row_data = clean_row_data(row_data) if clean_row_data is not None else row_data
 
             # give the model the ability to prevent a row from running through upsert
-            if hasattr(self.model_cls, 'should_upsert_row') and not getattr(self.model_cls, 'should_upsert_row')(cleaned_row_data):
+            if should_upsert_row is not None and not should_upsert_row(cleaned_row_data):
                 logger.debug(f'model prevented upsert of row {row_ix}')
                 continue
 
-            instance, created = self.upsert_model_data(row_ix, **cleaned_row_data)
+            prepared.append((row_ix, cleaned_row_data, self.clean_model_data(cleaned_row_data)))
 
-            instances.append(instance)
-            if created:
-                writeout_batch.append((instance, rows_start + row_ix + 1)) # + 1 to not count header
+        return prepared
 
-        if len(writeout_batch) > 0:
-            logger.debug(f'writing out remaining {len(writeout_batch)} instance IDs')
-            self.writeout_created_instance_ids(writeout_batch)
+    def clean_columns(self, batch_data):
+        """ runs the model's `clean_<field>_column` cleaners, each receiving all of a field's values in the batch at
+        once (as a `list`, or as a `pandas.Series`/`numpy.ndarray` depending on `column_cleaner_backend`) and returning
+        the cleaned values in the same order
+        :param batch_data: `list` of `dict` of row data, cleaned in place
+        """
+        for field in {field for row_data in batch_data for field in row_data}:
+            column_cleaner = getattr(self.model_cls, f'clean_{field}_column', None)
+            if column_cleaner is None:
+                continue
 
-        return instances
+            rows = [row_data for row_data in batch_data if field in row_data]
+            cleaned_values = column_cleaner(self.to_column([row_data[field] for row_data in rows]))
+            if hasattr(cleaned_values, 'tolist'):
+                cleaned_values = cleaned_values.tolist()
+
+            for row_data, value in zip(rows, cleaned_values):
+                row_data[field] = value
+
+    def to_column(self, values):
+        """ converts a list of column values to the type column cleaners receive
+        :param values: `list`
+        :return: `list`, `pandas.Series` or `numpy.ndarray`
+        :raises: `ImproperlyConfigured` if the backend is unknown or its library isn't installed
+        """
+        if self.column_cleaner_backend is None:
+            return values
+
+        try:
+            if self.column_cleaner_backend == 'pandas':
+                import pandas
+                return pandas.Series(values, dtype=object)
+            elif self.column_cleaner_backend == 'numpy':
+                import numpy
+                return numpy.array(values, dtype=object)
+        except ImportError as e:
+            raise ImproperlyConfigured(f'column_cleaner_backend {self.column_cleaner_backend} requires {e.name}')
+
+        raise ImproperlyConfigured(f'unknown column_cleaner_backend {self.column_cleaner_backend}')
+
+    @property
+    def model_fields(self):
+        if self._model_fields is None:
+            self._model_fields = {f.name for f in self.model_cls._meta.get_fields()}
+
+        return self._model_fields
+
+    def get_cell_cleaner(self, field):
+        """ gets the model's `clean_<field>_data` hook, unless the field is cleaned by a column cleaner instead
+        :param field: `str`
+        :return: `callable` or None
+        """
+        if field not in self._cell_cleaners:
+            has_column_cleaner = hasattr(self.model_cls, f'clean_{field}_column')
+            self._cell_cleaners[field] = None if has_column_cleaner else getattr(self.model_cls, f'clean_{field}_data', None)
+
+        return self._cell_cleaners[field]
 
     def upsert_model_data(self, row_ix, **data):
         """ takes a dict of field/value information from the sheet and inserts or updates a model instance
@@ -334,74 +1386,116 @@ class SheetPullInterface(BaseSheetInterface):
         :param row_ix: `int` index of the row which is being upserted into a model instance
         :param data: `dict`
         """
-        model_fields = {f.name for f in self.model_cls._meta.get_fields()}
-        # cleaned data
-        cleaned_data = {
-            field: getattr(self.model_cls, f'clean_{field}_data')(value) if hasattr(self.model_cls, f'clean_{field}_data') else value
-            for field, value in data.items() if field != self.sheet_id_field and field in model_fields
-        }
+        return self.save_model_data(row_ix, data, self.clean_model_data(data))
 
+    def clean_model_data(self, data):
+        """ picks the model fields out of a row's data and runs their `clean_<field>_data` hooks
+        :param data: `dict` of field/value information from the sheet
+        :return: `dict` of model field/value
+        """
+        cleaned_data = {}
+        for field, value in data.items():
+            if field == self.sheet_id_field or field not in self.model_fields:
+                continue
+
+            cell_cleaner = self.get_cell_cleaner(field)
+            cleaned_data[field] = cell_cleaner(value) if cell_cleaner is not None else value
+
+        return cleaned_data
+
+    def save_model_data(self, row_ix, data, cleaned_data):
+        """ inserts or updates a model instance with already cleaned data
+        :param row_ix: `int` index of the row which is being upserted into a model instance
+        :param data: `dict` of field/value information from the sheet
+        :param cleaned_data: `dict` of model field/value, as given by `clean_model_data`
+        :return: `two-tuple` of the instance and whether it was created, or of None and False when the row is a stale
+        copy of an instance routed to another shard
+        """
         try:
             row_id = data[self.sheet_id_field]
 
             model_filter = {
                 self.model_id_field: row_id
             }
-            instance, created = self.model_cls.objects.get(**model_filter), False
+            instance, created = self.model_cls.objects.filter(**self.queryset_filter).get(**model_filter), False
         except (KeyError, ObjectDoesNotExist, ValueError):
             logger.debug(f'creating new model instance')
             # if there's no ID field in the row or the ID doesnt exist
-            instance, created = self.model_cls.objects.create(**cleaned_data), True
+            with syncing():
+                instance, created = self.model_cls.objects.create(**dict(cleaned_data, **self.create_defaults)), True
+
+        if self.routes_elsewhere(instance):
+            if not created:
+                logger.info(f'skipping row {row_ix} of {self.sheet_range}, instance {instance} now belongs in another shard')
+                return None, False
+
+            logger.warning(f'instance {instance} created from row {row_ix} of {self.sheet_range} belongs in another '
+                           f'shard, pushes will append it there and leave row {row_ix} behind as a stale copy')
 
         if not created:
             logger.debug(f'updating instance {instance} with data')
-            [setattr(instance, field, value) for field, value in cleaned_data.items() if field != self.model_id_field]
-            instance.save()
+            [
+                setattr(instance, field, value) for field, value in cleaned_data.items()
+                if field != self.model_id_field and field not in self.create_defaults
+            ]
+            with syncing():
+                instance.save()
 
         sheet_row_processed.send(sender=self.model_cls, instance=instance, created=created, row_data=data)
 
         return instance, created
 
-    def writeout_created_instance_ids(self, created_instances):
-        cols_start, cols_end = self.sheet_range_cols
-        start_row = created_instances[0][1]
+    def routes_elsewhere(self, instance):
+        """ checks whether a sharded instance belongs in another sheet than the one pulled. When an instance's routing
+        value changes, pushes append it to its new shard while its old row stays behind, and pulling that stale row
+        would revert the instance
+        :param instance: model instance
+        :return: `bool`
+        """
+        if self.shard_strategy is None:
+            return False
+
+        try:
+            shard = self.shard_strategy.get_shard(instance, self.model_cls)
+        except KeyError:
+            return False
+
+        return self.model_cls.get_shard_location(shard, self.spreadsheet_id) != (self.spreadsheet_id, self.sheet_name)
+
+    @property
+    def create_defaults(self):
+        """ the field values of the `queryset_filter` given to instances created from the sheet, leaving out lookups
+        spanning relations like `get_or_create` does
+        :return: `dict`
+        """
+        return {field: value for field, value in self.queryset_filter.items() if '__' not in field}
 
-        # find the column letter where the sheet ID lives
+    def writeout_created_instance_ids(self, created_instances):
+        """ writes the IDs of instances created from sheet rows back to the sheet ID column of their rows, in one
+        sparse write however scattered the rows are
+        :param created_instances: `list` of `two-tuple` of the created instance and the index of its row in the sheet data
+        """
         sheet_id_ix = self.column_index(self.sheet_id_field)
-        sheet_id_col_ix = BaseSheetInterface.convert_col_letter_to_number(cols_start) + sheet_id_ix
-        sheet_id_col_name = BaseSheetInterface.convert_col_number_to_letter(sheet_id_col_ix)
-
-        writeout_ranges = []
-        writeout_data = []
-        last_writeout_ix = 0
-        # we segment the created instances into contiguous blocks of rows for the batch update
-        for i in range(len(created_instances)):
-            instance, row_ix = created_instances[i]
-            last_row_ix = created_instances[i - 1][1] if i > 0 else row_ix
-
-            # if we're at the end of a block of rows or on the last row, it delineates a writeout block
-            if row_ix > last_row_ix + 1:
-                writeout_ranges.append(BaseSheetInterface.get_sheet_range(
-                    self.sheet_name,
-                    f'{sheet_id_col_name}{start_row}:{sheet_id_col_name}{last_row_ix}'
-                ))
-                writeout_data.append(
-                    [[str(getattr(instance, self.model_id_field))] for instance, noop in created_instances[last_writeout_ix:i]]
-                )
-
-                start_row = row_ix
-                last_writeout_ix = i
-            elif i == len(created_instances) - 1:
-                writeout_ranges.append(BaseSheetInterface.get_sheet_range(
-                    self.sheet_name,
-                    f'{sheet_id_col_name}{start_row}:{sheet_id_col_name}{row_ix}'
-                ))
-                writeout_data.append(
-                    [[str(getattr(instance, self.model_id_field))] for instance, noop in created_instances[last_writeout_ix:]]
-                )
-
-        logger.debug(f'writing out {writeout_ranges} data ranges')
-        return self.writeout_batch(writeout_ranges, writeout_data)
+        cells = [(row_ix, sheet_id_ix, getattr(instance, self.model_id_field)) for instance, row_ix in created_instances]
+
+        logger.debug(f'writing out {len(cells)} instance IDs')
+        return self.writeout_cells(cells)
+
+
+def init_pull_worker():
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def prepare_batch_in_worker(model_label, interface_kwargs, batch, field_indexes):
+    """ runs `SheetPullInterface.prepare_batch` in a worker process """
+    from django.apps import apps
+
+    interface = SheetPullInterface(apps.get_model(model_label), None, **interface_kwargs)
+    return interface.prepare_batch(batch, field_indexes)
 
 
 class SheetSync(SheetPushInterface, SheetPullInterface):
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from gsheets.models import AccessCredentials
+from gsheets.settings import gsheets_settings
+import json
+
+
+class Command(BaseCommand):
+    help = 'Registers a service account key as credentials for syncing sheets shared with the service account'
+
+    def add_arguments(self, parser):
+        parser.add_argument('key_file', help='path to the JSON key of the service account')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['key_file']) as f:
+                info = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'could not read service account key {options["key_file"]}: {e}')
+
+        if info.get('type') != 'service_account':
+            raise CommandError(f'{options["key_file"]} is not a service account key')
+
+        ac = AccessCredentials.objects.create(
+            service_account_info=json.dumps(info), token_uri=info.get('token_uri', ''),
+            client_id=info.get('client_id', ''), scopes=json.dumps(gsheets_settings.SCOPES)
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully added service account {info.get("client_email")} ({ac.id})'))
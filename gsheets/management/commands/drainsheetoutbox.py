@@ -0,0 +1,8 @@
+from gsheets.management.drain import DrainCommand
+from gsheets.outbox import drain_outbox
+
+
+class Command(DrainCommand):
+    help = 'Pushes the model instances queued in the sheet outbox to their sheets'
+    drain = staticmethod(drain_outbox)
+    entries_name = 'outbox entries'
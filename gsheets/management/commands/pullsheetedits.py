@@ -0,0 +1,9 @@
+from gsheets.management.drain import DrainCommand
+from gsheets.edits import drain_sheet_edits
+
+
+class Command(DrainCommand):
+    help = 'Pulls the sheet rows reported by edit notifications into their models'
+    drain = staticmethod(drain_sheet_edits)
+    entries_name = 'edited rows'
+    drained_verb = 'pulled'
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+import time
+
+
+class DrainCommand(BaseCommand):
+    """ base of the commands draining a queue table batch by batch, once or in a loop """
+    # `callable` taking the batch size and returning the number of entries drained
+    drain = None
+    # what the drained entries are called in the command's output, like 'outbox entries'
+    entries_name = 'entries'
+    # what draining entries is called in the command's output, like 'drained'
+    drained_verb = 'drained'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help=f'max {self.entries_name} to claim per batch')
+        parser.add_argument('--loop', action='store_true', help=f'keep draining as new {self.entries_name} are queued')
+        parser.add_argument(
+            '--sleep', type=float, default=1.0, help=f'seconds to wait when no {self.entries_name} are queued'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+
+        while True:
+            drained = self.drain(options['batch_size'])
+            total += drained
+
+            if drained > 0:
+                self.stdout.write(f'{self.drained_verb} {drained} {self.entries_name}')
+                continue
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully {self.drained_verb} {total} {self.entries_name}'))
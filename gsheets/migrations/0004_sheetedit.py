@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gsheets', '0003_sheetoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SheetEdit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spreadsheet_id', models.CharField(max_length=255)),
+                ('sheet_name', models.CharField(max_length=255)),
+                ('row', models.PositiveIntegerField()),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gsheets', '0004_sheetedit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SheetRevision',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=255)),
+                ('spreadsheet_id', models.CharField(max_length=255)),
+                ('sheet_name', models.CharField(max_length=255)),
+                ('revision', models.CharField(max_length=255)),
+                ('checked_time', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('model', 'spreadsheet_id', 'sheet_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gsheets', '0005_sheetrevision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=255)),
+                ('spreadsheet_id', models.CharField(max_length=255)),
+                ('sheet_name', models.CharField(max_length=255)),
+                ('direction', models.CharField(choices=[('pull', 'Pull'), ('push', 'Push')], max_length=4)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('snapshot', models.CharField(max_length=255)),
+                ('updated_time', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('model', 'spreadsheet_id', 'sheet_name', 'direction')},
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gsheets', '0006_synccheckpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='accesscredentials',
+            name='token',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='accesscredentials',
+            name='refresh_token',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='accesscredentials',
+            name='token_uri',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='accesscredentials',
+            name='client_id',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='accesscredentials',
+            name='client_secret',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='accesscredentials',
+            name='service_account_info',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='accesscredentials',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='accesscredentials',
+            name='leased_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='accesscredentials',
+            name='rate_limited_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='accesscredentials',
+            name='rate_limit_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gsheets', '0007_accesscredentials_pool'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sheetoutbox',
+            name='claimed_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
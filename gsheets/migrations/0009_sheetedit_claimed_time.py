@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gsheets', '0008_sheetoutbox_claimed_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sheetedit',
+            name='claimed_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
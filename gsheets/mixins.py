@@ -1,9 +1,10 @@
-from googleapiclient.discovery import build
-from django.core.exceptions import ObjectDoesNotExist
-from .auth import get_gapi_credentials
-from .gsheets import SheetPullInterface, SheetPushInterface, SheetSync
-import string
-import re
+from django.db import router, transaction
+from .gsheets import BaseSheetInterface, SheetPullInterface, SheetPushInterface, SheetSync
+from .cache import get_cache, get_generation
+from .query import get_memoized_query
+from .related import get_related_lookups
+from .clients import SheetClients
+from .fanout import fan_out
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,17 +28,210 @@ class BaseGoogleSheetMixin(object):
     max_rows = 30000
     # max column to support in the sheet
     max_col = 'Z'
+    # name of an optional sheet column storing a digest of each row, used to skip unchanged rows on pull
+    sheet_checksum_field = None
+    # hold sheet data in memory column by column with interned strings, for very large sheets
+    columnar_sheet_data = False
+    # read unformatted values and serial dates, converting them with parsers compiled from the model's field types
+    typed_values = False
+    # related fields synced through a column of the related object, like {'owner': ('Person', 'last_name__iexact', 'owner_last_name')}
+    sheet_related_lookups = {}
+    # record checkpoints so a pull or push that died part way resumes from its last completed batch
+    resumable_sync = False
+    # spread the model's rows across several sheets with a `BaseShardStrategy`, like `HashShardStrategy(['A', 'B'])`
+    sheet_shard_strategy = None
+    # the max number of sheets (shards or targets) read from or written to at once
+    sheet_concurrency = 4
+    # seconds to reuse the sheet data read by `query_sheet`, None to read the sheet on every call
+    sheet_read_cache_ttl = 60
+
+    @classmethod
+    def get_sheet_interface_kwargs(cls):
+        """ get the kwargs shared by every sheet interface built for this model """
+        return dict(
+            sheet_name=cls.sheet_name, data_range=cls.data_range, model_id_field=cls.model_id_field,
+            sheet_id_field=cls.sheet_id_field, batch_size=cls.batch_size, max_rows=cls.max_rows, max_col=cls.max_col,
+            checksum_field=cls.sheet_checksum_field, columnar=cls.columnar_sheet_data, typed_values=cls.typed_values,
+            related_lookups=cls.sheet_related_lookups, resumable=cls.resumable_sync
+        )
+
+    @classmethod
+    def query_sheet(cls, location=None):
+        """ gets a `SheetQuerySet` to look rows of the sheet up without pulling them. The sheet data is read through
+        the Django cache and the queryset, with the indexes built by its lookups, is reused by later calls for up to
+        `sheet_read_cache_ttl` seconds or until the sheet is written to. When the read cache is disabled (see
+        `gsheets.cache.get_cache`) the sheet is read on every call
+        :param location: `two-tuple` of spreadsheet ID and sheet name of the sheet (target or shard) to query, the
+        model's own sheet by default
+        :return: `SheetQuerySet`
+        """
+        spreadsheet_id, sheet_name = location or (cls.spreadsheet_id, cls.sheet_name)
+        # without a read cache, writes can't be tracked and the sheet is read on every call
+        ttl = cls.sheet_read_cache_ttl if get_cache() is not None else None
+        interface = BaseSheetInterface(
+            cls, spreadsheet_id, **dict(cls.get_sheet_interface_kwargs(), sheet_name=sheet_name, read_cache_ttl=ttl)
+        )
+
+        return get_memoized_query(
+            (cls._meta.label, spreadsheet_id, sheet_name), get_generation(spreadsheet_id, sheet_name), ttl,
+            interface.query
+        )
+
+    @classmethod
+    def get_sheet_targets(cls):
+        """ get the spreadsheets this model syncs to, each holding the slice of instances matching a queryset filter.
+        Override to keep one spreadsheet per customer, like
+        `[(c.spreadsheet_id, {'customer_id': c.id}) for c in Customer.objects.all()]`
+        :return: `list` of `two-tuple` of spreadsheet ID and `dict` of queryset filter
+        """
+        return [(cls.spreadsheet_id, {})]
+
+    @classmethod
+    def get_sheet_locations(cls):
+        """ get the sheets holding this model's rows: one per target, or one per shard of each target when the model
+        is sharded
+        :return: `dict` of `two-tuple` of spreadsheet ID and sheet name to the `dict` queryset filter of its target
+        """
+        locations = {}
+        for spreadsheet_id, queryset_filter in cls.get_sheet_targets():
+            if cls.sheet_shard_strategy is None:
+                locations[(spreadsheet_id, cls.sheet_name)] = queryset_filter
+                continue
+
+            for shard in cls.sheet_shard_strategy.all_shards:
+                locations[cls.get_shard_location(shard, spreadsheet_id)] = queryset_filter
+
+        return locations
+
+    @classmethod
+    def get_shard_location(cls, shard, spreadsheet_id=None):
+        """ get the spreadsheet ID and sheet name of a `SheetShard`
+        :param shard: `SheetShard`
+        :param spreadsheet_id: `str` ID of the target spreadsheet for shards that don't name one, the model's by default
+        :return: `two-tuple`
+        """
+        return shard.spreadsheet_id or spreadsheet_id or cls.spreadsheet_id, shard.sheet_name
 
 
 class SheetPushableMixin(BaseGoogleSheetMixin):
     """ mixes in functionality to push data from a Django model to a google sheet. """
+    # append rows that aren't in the sheet yet instead of rewriting the table, and only rewrite changed rows
+    append_new_rows = False
+    # the number of new rows to send in each append request
+    append_batch_size = 5000
+    # the max number of batches queued for a background writer while the next ones are built, like 2. 0 pushes
+    # synchronously
+    push_pipeline_depth = 0
+    # read only the sheet's header row and ID column (plus checksum column) to find existing rows, instead of the whole sheet
+    push_id_column_only = False
+    # push changed instances shortly after they're saved, coalescing bursts of saves into one write
+    write_behind = False
+    # queue pushes of saved instances in the SheetOutbox table, drained by the `drainsheetoutbox` command
+    transactional_outbox = False
+
+    def save(self, *args, **kwargs):
+        if not self.transactional_outbox:
+            return super(SheetPushableMixin, self).save(*args, **kwargs)
+
+        # the outbox row is written by a post_save handler, commit it in the same transaction as the save
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            return super(SheetPushableMixin, self).save(*args, **kwargs)
+
     @classmethod
     def push_to_sheet(cls):
-        interface = SheetPushInterface(cls, cls.spreadsheet_id, sheet_name=cls.sheet_name, data_range=cls.data_range,
-                                       model_id_field=cls.model_id_field, sheet_id_field=cls.sheet_id_field,
-                                       batch_size=cls.batch_size, max_rows=cls.max_rows, max_col=cls.max_col,
-                                       push_fields=cls.get_sheet_push_fields(), queryset=cls.get_sheet_queryset())
-        return interface.upsert_table()
+        return cls.push_queryset_to_sheet(cls.get_sheet_queryset(), append_new_rows=cls.append_new_rows)
+
+    @classmethod
+    def push_rows_to_sheet(cls, pks, clients=None):
+        """ pushes only the instances with the given primary keys, appending the ones that aren't in the sheet yet
+        and rewriting the ones that changed
+        :param pks: `list` of primary keys
+        :param clients: `SheetClients` to push with, new ones by default
+        """
+        # push checkpoints are positions in the full queryset, a partial push must neither resume from nor clear them
+        return cls.push_queryset_to_sheet(
+            cls.get_sheet_queryset().filter(pk__in=pks), append_new_rows=True, clients=clients, resumable=False
+        )
+
+    @classmethod
+    def push_queryset_to_sheet(cls, queryset, append_new_rows, clients=None, **kwargs):
+        """ pushes the instances of a queryset to every target spreadsheet, each getting the instances matching its
+        filter. Targets and shards are written to in parallel, sharing credentials and API clients
+        :param queryset: `QuerySet` of instances to push
+        :param append_new_rows: `bool` whether to append new rows instead of rewriting the table
+        :param clients: `SheetClients` to push with, like the long-lived ones of a write-behind flusher, new ones by
+        default
+        :param kwargs: `dict` of interface kwargs overriding the model's
+        """
+        clients = clients or SheetClients()
+        interfaces = []
+        for spreadsheet_id, queryset_filter in cls.get_sheet_targets():
+            interfaces += cls.get_target_push_interfaces(
+                queryset.filter(**queryset_filter), spreadsheet_id, clients=clients, append_new_rows=append_new_rows,
+                **kwargs
+            )
+
+        fan_out(SheetPushInterface.upsert_table, interfaces, cls.sheet_concurrency)
+
+        logger.info(f'pushed {cls} to {len(interfaces)} sheets with {clients.stats["requests"]} requests, '
+                    f'{clients.stats["bytes_sent"]} bytes sent and {clients.stats["bytes_received"]} received')
+
+    @classmethod
+    def get_target_push_interfaces(cls, queryset, spreadsheet_id, **kwargs):
+        """ builds the interfaces pushing a queryset to a target spreadsheet. When the model is sharded the queryset
+        is read once and its instances routed to their shards, leaving out (and logging) instances no shard takes
+        :param queryset: `QuerySet` of instances to push
+        :param spreadsheet_id: `str` ID of the target spreadsheet
+        :param kwargs: `dict` of interface kwargs overriding the model's
+        :return: `list` of `SheetPushInterface`
+        """
+        if cls.sheet_shard_strategy is None:
+            return [cls.get_push_interface(queryset, location=(spreadsheet_id, cls.sheet_name), **kwargs)]
+
+        lookups = get_related_lookups(cls, cls.sheet_related_lookups)
+        if lookups:
+            queryset = queryset.select_related(*[lookup.select_related for lookup in lookups])
+        if not queryset.ordered:
+            # a stable order keeps resumable pushes of each shard resuming at the right instance
+            queryset = queryset.order_by('pk')
+
+        instances_by_shard = {}
+        for obj in queryset:
+            try:
+                shard = cls.sheet_shard_strategy.get_shard(obj, cls)
+            except KeyError as e:
+                # one instance without a shard (like a None date without a default shard) mustn't stop the push
+                logger.warning(f'skipping push of {obj}, no shard of {cls} for key {e}')
+                continue
+
+            instances_by_shard.setdefault(shard, []).append(obj)
+
+        logger.debug(f'routed {len(queryset)} instances of {cls} to {len(instances_by_shard)} shards of {spreadsheet_id}')
+
+        return [
+            cls.get_push_interface(instances, location=cls.get_shard_location(shard, spreadsheet_id), **kwargs)
+            for shard, instances in instances_by_shard.items()
+        ]
+
+    @classmethod
+    def get_push_interface(cls, queryset, location=None, **kwargs):
+        """ builds the interface pushing to one of the model's sheets
+        :param queryset: `QuerySet` or `list` of instances to push
+        :param location: `two-tuple` of spreadsheet ID and sheet name, the model's own sheet by default
+        :param kwargs: `dict` of interface kwargs overriding the model's
+        :return: `SheetPushInterface`
+        """
+        spreadsheet_id, sheet_name = location or (cls.spreadsheet_id, cls.sheet_name)
+        interface_kwargs = dict(
+            cls.get_sheet_interface_kwargs(), sheet_name=sheet_name, queryset=queryset,
+            push_fields=cls.get_sheet_push_fields(), append_new_rows=cls.append_new_rows,
+            append_batch_size=cls.append_batch_size, push_pipeline_depth=cls.push_pipeline_depth,
+            id_column_only=cls.push_id_column_only
+        )
+        interface_kwargs.update(kwargs)
+
+        return SheetPushInterface(cls, spreadsheet_id, **interface_kwargs)
 
     @classmethod
     def get_sheet_queryset(cls):
@@ -54,17 +248,77 @@ class SheetPullableMixin(BaseGoogleSheetMixin):
     * won't delete rows that are in the sheet but not the DB
     * will update existing row values with values from the sheet
     """
+    # skip pulls when the spreadsheet hasn't changed since the last pull (needs a Drive metadata scope)
+    skip_unchanged_pulls = False
+    # what clean_<field>_column cleaners receive: None for lists, or 'pandas' / 'numpy'
+    column_cleaner_backend = None
+    # number of worker processes preparing pulled rows in parallel, None to prepare them in the pulling process
+    pull_processes = None
+    # what to do with rows failing to upsert: 'raise' rolls back their batch and stops, 'skip' logs and skips them
+    pull_failed_row_policy = 'raise'
+
     @classmethod
     def pull_sheet(cls):
-        interface = SheetPullInterface(cls, cls.spreadsheet_id, sheet_name=cls.sheet_name, data_range=cls.data_range,
-                                       model_id_field=cls.model_id_field, sheet_id_field=cls.sheet_id_field,
-                                       batch_size=cls.batch_size, max_rows=cls.max_rows, max_col=cls.max_col, pull_fields=cls.get_sheet_pull_fields())
+        clients = SheetClients()
+        locations = list(cls.get_sheet_locations().items())
+        instances = []
+        group_size = max(cls.sheet_concurrency or 1, 1)
+
+        for group_start in range(0, len(locations), group_size):
+            group = [
+                cls.get_pull_interface(location=location, queryset_filter=queryset_filter, clients=clients)
+                for location, queryset_filter in locations[group_start:group_start + group_size]
+            ]
+            if len(group) > 1:
+                # download a group of sheets in parallel, then upsert them one after the other so only one pull writes
+                # at a time, and only a group's worth of sheet data is held in memory
+                fan_out(SheetPullInterface.prefetch, group, group_size)
+
+            for interface in group:
+                instances += interface.pull_sheet()
+
+        logger.info(f'pulled {cls} from {len(locations)} sheets with {clients.stats["requests"]} requests, '
+                    f'{clients.stats["bytes_sent"]} bytes sent and {clients.stats["bytes_received"]} received')
+
+        return instances
+
+    @classmethod
+    def pull_sheet_rows(cls, rows, location=None):
+        """ pulls only the given rows of the sheet
+        :param rows: `list` of `int` row numbers as shown in the sheet
+        :param location: `two-tuple` of spreadsheet ID and sheet name of the sheet (target or shard) holding the rows, the
+        model's own sheet by default
+        """
+        location = location or (cls.spreadsheet_id, cls.sheet_name)
+        interface = cls.get_pull_interface(
+            location=location, queryset_filter=cls.get_sheet_locations().get(location), skip_unchanged=False,
+            pull_processes=None
+        )
+
+        return interface.pull_rows(rows)
+
+    @classmethod
+    def get_pull_interface(cls, location=None, **kwargs):
+        """ builds the interface pulling from one of the model's sheets
+        :param location: `two-tuple` of spreadsheet ID and sheet name, the model's own sheet by default
+        :param kwargs: `dict` of interface kwargs overriding the model's
+        :return: `SheetPullInterface`
+        """
+        spreadsheet_id, sheet_name = location or (cls.spreadsheet_id, cls.sheet_name)
+        interface_kwargs = dict(
+            cls.get_sheet_interface_kwargs(), sheet_name=sheet_name, pull_fields=cls.get_sheet_pull_fields(),
+            skip_unchanged=cls.skip_unchanged_pulls, pull_processes=cls.pull_processes,
+            column_cleaner_backend=cls.column_cleaner_backend, failed_row_policy=cls.pull_failed_row_policy,
+            shard_strategy=cls.sheet_shard_strategy
+        )
+        interface_kwargs.update(kwargs)
 
-        return interface.pull_sheet()
+        return SheetPullInterface(cls, spreadsheet_id, **interface_kwargs)
 
     @classmethod
     def get_sheet_pull_fields(cls):
-        """ get the field names from the sheet which are to be pulled. MUST INCLUDE THE sheet_id_field """
+        """ get the field names from the sheet which are to be pulled. MUST INCLUDE THE sheet_id_field. Unless the model
+        has a `sheet_checksum_field`, pulls only download these columns """
         return 'all'
 
 
@@ -3,12 +3,24 @@ import json
 
 
 class AccessCredentials(models.Model):
-    token = models.CharField(max_length=255)
-    refresh_token = models.CharField(max_length=255)
-    token_uri = models.CharField(max_length=255)
-    client_id = models.CharField(max_length=255)
-    client_secret = models.CharField(max_length=255)
+    """ credentials of an account authorized through the OAuth flow, or of a service account when
+    `service_account_info` holds its JSON key. With the `CREDENTIAL_POOL` setting on, every active credential is
+    used in turn, spreading syncs across the accounts' quotas
+    """
+    token = models.CharField(max_length=255, blank=True, default='')
+    refresh_token = models.CharField(max_length=255, blank=True, default='')
+    token_uri = models.CharField(max_length=255, blank=True, default='')
+    client_id = models.CharField(max_length=255, blank=True, default='')
+    client_secret = models.CharField(max_length=255, blank=True, default='')
     scopes = models.CharField(max_length=255)
+    service_account_info = models.TextField(blank=True, default='')
+
+    is_active = models.BooleanField(default=True)
+    # when the credentials were last handed to a sync, the pool leases the least recently used ones first
+    leased_time = models.DateTimeField(null=True, blank=True)
+    # the pool skips credentials until this time after the API rate limited them
+    rate_limited_until = models.DateTimeField(null=True, blank=True)
+    rate_limit_count = models.PositiveIntegerField(default=0)
 
     created_time = models.DateTimeField(auto_now_add=True)
 
@@ -16,5 +28,88 @@ class AccessCredentials(models.Model):
     def parsed_scopes(self):
         return json.loads(self.scopes)
 
+    @property
+    def parsed_service_account_info(self):
+        return json.loads(self.service_account_info) if self.service_account_info else None
+
     def __str__(self):
+        if self.service_account_info:
+            return f'{self.parsed_service_account_info.get("client_email")} ({self.id})'
+
         return f'{self.token} // {self.refresh_token} ({self.id})'
+
+
+class SheetOutbox(models.Model):
+    """ a pending push of a model instance to its sheet, written in the same transaction as the instance save and
+    drained in batches by the `drainsheetoutbox` management command
+    """
+    model = models.CharField(max_length=255)
+    object_id = models.CharField(max_length=255)
+    # when a drainer claimed the entry to push it, None while it waits to be claimed
+    claimed_time = models.DateTimeField(null=True, blank=True)
+
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.model} {self.object_id} ({self.id})'
+
+
+class SheetEdit(models.Model):
+    """ a sheet row reported as edited by a signed edit notification, waiting to be pulled by the `pullsheetedits`
+    management command
+    """
+    spreadsheet_id = models.CharField(max_length=255)
+    sheet_name = models.CharField(max_length=255)
+    row = models.PositiveIntegerField()
+    # when a drainer claimed the edit to pull it, None while it waits to be claimed
+    claimed_time = models.DateTimeField(null=True, blank=True)
+
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.spreadsheet_id} {self.sheet_name}!{self.row} ({self.id})'
+
+
+class SheetRevision(models.Model):
+    """ the last spreadsheet revision a model pulled, used to skip pulls of spreadsheets nobody has touched since """
+    model = models.CharField(max_length=255)
+    spreadsheet_id = models.CharField(max_length=255)
+    sheet_name = models.CharField(max_length=255)
+    revision = models.CharField(max_length=255)
+
+    checked_time = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('model', 'spreadsheet_id', 'sheet_name')
+
+    def __str__(self):
+        return f'{self.model} {self.spreadsheet_id} {self.sheet_name} @ {self.revision} ({self.id})'
+
+
+class SyncCheckpoint(models.Model):
+    """ progress of a long-running pull or push, so a sync that died part way resumes after its last committed batch
+    instead of starting over
+    """
+    DIRECTION_PULL = 'pull'
+    DIRECTION_PUSH = 'push'
+    DIRECTION_CHOICES = (
+        (DIRECTION_PULL, 'Pull'),
+        (DIRECTION_PUSH, 'Push'),
+    )
+
+    model = models.CharField(max_length=255)
+    spreadsheet_id = models.CharField(max_length=255)
+    sheet_name = models.CharField(max_length=255)
+    direction = models.CharField(max_length=4, choices=DIRECTION_CHOICES)
+    # the number of rows (pull) or instances (push) fully processed
+    position = models.PositiveIntegerField(default=0)
+    # identifies the structure of the sheet the position applies to
+    snapshot = models.CharField(max_length=255)
+
+    updated_time = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('model', 'spreadsheet_id', 'sheet_name', 'direction')
+
+    def __str__(self):
+        return f'{self.direction} {self.model} {self.spreadsheet_id} {self.sheet_name} @ {self.position} ({self.id})'
@@ -0,0 +1,48 @@
+from django.apps import apps
+from django.db.models.signals import post_save
+from .models import SheetOutbox
+from .queues import drain_entries
+from .settings import gsheets_settings
+from .syncing import is_syncing
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def record_saved_instance(sender, instance=None, raw=False, **kwargs):
+    if raw or is_syncing():
+        # fixtures and rows pulled from the sheet are already in line with it
+        return
+
+    SheetOutbox.objects.create(model=sender._meta.label, object_id=str(instance.pk))
+
+
+def connect_outbox(model):
+    """ hooks a model's save signal up to the sheet outbox. `SheetPushableMixin.save` runs the save in a transaction,
+    so the outbox row commits with the save or not at all
+    :param model: `SheetPushableMixin` model class
+    """
+    post_save.connect(record_saved_instance, sender=model, dispatch_uid=f'gsheets_outbox_save_{model._meta.label}')
+
+
+def push_outbox_entries(label, entries):
+    """ pushes the instances a model's outbox entries refer to
+    :param label: `str` label of the model
+    :param entries: `list` of `SheetOutbox`
+    """
+    # several saves of the same instance collapse into a single row push
+    pks = list({entry.object_id: None for entry in entries})
+    logger.debug(f'pushing {len(pks)} outbox rows for model {label}')
+    apps.get_model(label).push_rows_to_sheet(pks)
+
+
+def drain_outbox(batch_size):
+    """ claims up to `batch_size` outbox entries, pushes the instances they refer to and deletes them. Entries are
+    only deleted once their model's push succeeded, the entries of a failed push are released for the next drain.
+    Claims older than `OUTBOX_CLAIM_TIMEOUT` are from drainers that died mid push and can be claimed again
+    :param batch_size: `int` the max number of outbox entries to claim
+    :return: `int` the number of outbox entries drained
+    """
+    return drain_entries(
+        SheetOutbox, batch_size, gsheets_settings.OUTBOX_CLAIM_TIMEOUT, lambda entry: entry.model, push_outbox_entries
+    )
@@ -0,0 +1,92 @@
+from django.db import connection
+import threading
+import queue
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWriter(object):
+    """ runs writeouts one after the other, in the order they're submitted, on a background thread so the next batch
+    can be prepared while the previous one is being sent. At most `depth` submitted calls wait for the writer; beyond
+    that `submit` blocks until the writer catches up. Once a call fails the remaining ones are dropped and the error is
+    raised from the next `submit` or from `close`. Use as a context manager:
+
+        with BackgroundWriter(2) as writer:
+            writer.submit(interface.writeout_rows, new_rows, changed_cells)
+    """
+    def __init__(self, depth):
+        """
+        :param depth: `int` the max number of calls waiting for the writer, 0 or None to run calls in place instead
+        """
+        self.depth = depth or 0
+        self.error = None
+        self._queue = None
+        self._thread = None
+
+    def __enter__(self):
+        if self.depth > 0:
+            self._queue = queue.Queue(maxsize=self.depth)
+            self._thread = threading.Thread(target=self.run, name='gsheets-push-writer', daemon=True)
+            self._thread.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # let the error from the producing side propagate, the writer's own error (if any) is only logged
+            self.stop()
+            if self.error is not None:
+                logger.error(f'push writer failed with {self.error!r} while the push was failing')
+
+    def submit(self, fn, *args):
+        """ queues a call for the writer
+        :param fn: `callable`
+        :param args: positional args to call `fn` with
+        :raises: the error of a previously submitted call which failed
+        """
+        self.raise_error()
+
+        if self._thread is None:
+            return fn(*args)
+
+        self._queue.put((fn, args))
+
+    def run(self):
+        try:
+            while True:
+                call = self._queue.get()
+                if call is None:
+                    return
+
+                fn, args = call
+                if self.error is not None:
+                    continue
+
+                try:
+                    fn(*args)
+                except Exception as e:
+                    self.error = e
+        finally:
+            # calls like checkpoint saves open a DB connection for this thread, don't leave it open
+            connection.close()
+
+    def stop(self):
+        """ waits for the calls already submitted and stops the writer thread """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """ stops the writer once every submitted call ran
+        :raises: the error of a submitted call which failed
+        """
+        self.stop()
+        self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,203 @@
+from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
+from .columnar import ColumnarSheetData
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SheetQuerySet(object):
+    """ a read-only, QuerySet-like view over the rows of a sheet, for looking rows up without pulling them into
+    models. Rows are dicts of header to cell value. Lookups are exact matches of a column's cells, compared as strings,
+    or `<column>__in` matches against a list of values; `pk` stands for the key column. The first lookup on a column
+    builds a hash index of it, which every queryset derived from the same sheet shares, so later lookups are O(1):
+
+        cars = interface.query()
+        cars.get(pk='12')
+        cars.filter(make='Ford', year__in=['2019', '2020']).values('model', 'year')
+    """
+    def __init__(self, headers, rows, key_column=None, lookups=(), indexes=None):
+        """
+        :param headers: `list` of `str` header row of the sheet
+        :param rows: `list` of `list` rows under the header, or `ColumnarSheetData`
+        :param key_column: `str` header of the column `pk` lookups match, like the sheet ID field
+        :param lookups: `tuple` of `two-tuple` of column index and `set` of `str` values a row's cell must be one of
+        :param indexes: `dict` of column index to hash index, shared with the querysets this one derives from
+        """
+        self.headers = headers
+        self.rows = rows
+        self.key_column = key_column
+        self._lookups = lookups
+        self._indexes = indexes if indexes is not None else {}
+        self._row_indexes = None
+
+    def __iter__(self):
+        for ix in self.row_indexes:
+            yield self.get_row_dict(self.rows[ix])
+
+    def __len__(self):
+        return len(self.row_indexes)
+
+    def __repr__(self):
+        return f'<SheetQuerySet of {len(self)} rows>'
+
+    def count(self):
+        return len(self)
+
+    def exists(self):
+        return len(self) > 0
+
+    def first(self):
+        return next(iter(self), None)
+
+    def filter(self, **lookups):
+        """ narrows the rows down to the ones matching every lookup
+        :param lookups: `dict` of `<column>` or `<column>__in` to the value(s) to match
+        :return: `SheetQuerySet`
+        :raises: `KeyError` if a lookup names a column the sheet doesn't have
+        """
+        parsed = []
+        for lookup, value in lookups.items():
+            column, values = lookup, [value]
+            if lookup.endswith('__in') and lookup not in self.headers:
+                column, values = lookup[:-len('__in')], value
+
+            if column == 'pk' and 'pk' not in self.headers:
+                column = self.key_column
+
+            parsed.append((self.column_index(column), {str(v) for v in values}))
+
+        return SheetQuerySet(self.headers, self.rows, key_column=self.key_column,
+                             lookups=self._lookups + tuple(parsed), indexes=self._indexes)
+
+    def get(self, **lookups):
+        """ gets the one row matching the lookups
+        :param lookups: `dict` of lookups, like `filter`
+        :return: `dict` of header to cell value
+        :raises: `ObjectDoesNotExist` if no row matches, `MultipleObjectsReturned` if several do
+        """
+        queryset = self.filter(**lookups)
+        if len(queryset) == 0:
+            raise ObjectDoesNotExist(f'no sheet row matches {lookups}')
+        if len(queryset) > 1:
+            raise MultipleObjectsReturned(f'{len(queryset)} sheet rows match {lookups}')
+
+        return queryset.first()
+
+    def values(self, *columns):
+        """ gets the matching rows with only the given columns
+        :param columns: `str` headers of the columns to keep, every column when none are given
+        :return: `list` of `dict` of header to cell value
+        """
+        if not columns:
+            return list(self)
+
+        column_indexes = [(column, self.column_index(column)) for column in columns]
+        return [
+            {column: self.get_cell(self.rows[ix], col_ix) for column, col_ix in column_indexes}
+            for ix in self.row_indexes
+        ]
+
+    def values_list(self, *columns, flat=False):
+        """ gets the matching rows as tuples of the given columns' values
+        :param columns: `str` headers of the columns to keep
+        :param flat: `bool` whether to return single values instead of 1-tuples, when one column is given
+        :return: `list` of `tuple`, or of values when flat
+        """
+        if flat and len(columns) != 1:
+            raise TypeError('values_list with flat=True needs exactly one column')
+
+        column_indexes = [self.column_index(column) for column in columns]
+        rows = [tuple(self.get_cell(self.rows[ix], col_ix) for col_ix in column_indexes) for ix in self.row_indexes]
+
+        return [row[0] for row in rows] if flat else rows
+
+    def column_index(self, column):
+        try:
+            return self.headers.index(column)
+        except ValueError:
+            raise KeyError(f'the sheet has no column {column}')
+
+    @property
+    def row_indexes(self):
+        """ the indexes of the rows matching every lookup, in sheet order. The lookup matching the fewest rows narrows
+        the candidates down through its index, the other lookups are checked on those candidates only
+        :return: `list` of `int`
+        """
+        if self._row_indexes is not None:
+            return self._row_indexes
+
+        if not self._lookups:
+            self._row_indexes = list(range(len(self.rows)))
+            return self._row_indexes
+
+        candidates = []
+        for col_ix, values in self._lookups:
+            index = self.get_index(col_ix)
+            candidates.append(([ix for value in values for ix in index.get(value, [])], col_ix, values))
+
+        candidates.sort(key=lambda candidate: len(candidate[0]))
+        matching, noop, noop = candidates[0]
+
+        for noop, col_ix, values in candidates[1:]:
+            matching = [ix for ix in matching if str(self.get_cell(self.rows[ix], col_ix)) in values]
+
+        self._row_indexes = sorted(set(matching))
+        return self._row_indexes
+
+    def get_index(self, col_ix):
+        """ gets the hash index of a column, building it on first use
+        :param col_ix: `int` index of the column
+        :return: `dict` of `str` cell value to `list` of `int` indexes of the rows holding it
+        """
+        if col_ix not in self._indexes:
+            if isinstance(self.rows, ColumnarSheetData):
+                cells = self.rows.column(col_ix)
+            else:
+                cells = [self.get_cell(row, col_ix) for row in self.rows]
+
+            index = {}
+            for ix, cell in enumerate(cells):
+                index.setdefault(str(cell if cell is not None else ''), []).append(ix)
+
+            logger.debug(f'built index of {len(index)} values for column {self.headers[col_ix]}')
+            self._indexes[col_ix] = index
+
+        return self._indexes[col_ix]
+
+    @staticmethod
+    def get_cell(row, col_ix):
+        """ gets a cell of a row, '' when the row is too short to have it (the API drops trailing empty cells) """
+        return row[col_ix] if col_ix < len(row) and row[col_ix] is not None else ''
+
+    def get_row_dict(self, row):
+        return {header: self.get_cell(row, col_ix) for col_ix, header in enumerate(self.headers)}
+
+
+# memoized querysets of the sheets read through `get_memoized_query`
+_memoized_queries = {}
+
+
+def get_memoized_query(key, generation, ttl, build):
+    """ gets the queryset over a sheet built by a previous call, with its indexes, as long as it's younger than `ttl`
+    and the sheet wasn't written to since, otherwise builds it again
+    :param key: `tuple` identifying the queryset, like the model, spreadsheet ID and sheet name
+    :param generation: `int` current cache generation of the sheet, see `gsheets.cache.get_generation`
+    :param ttl: `int` seconds to reuse a queryset for, None to build it on every call
+    :param build: `callable` building the queryset
+    :return: `SheetQuerySet`
+    """
+    if not ttl:
+        _memoized_queries.pop(key, None)
+        return build()
+
+    memoized = _memoized_queries.get(key)
+    if memoized is not None:
+        memoized_generation, expires, queryset = memoized
+        if memoized_generation == generation and time.monotonic() < expires:
+            return queryset
+
+    queryset = build()
+    _memoized_queries[key] = (generation, time.monotonic() + ttl, queryset)
+
+    return queryset
@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def claim_entries(queue_model, batch_size, claim_timeout):
+    """ claims up to `batch_size` entries of a queue table nobody is processing, in a short transaction. Entries are
+    selected with `SELECT ... FOR UPDATE SKIP LOCKED`, so several drainers can claim in parallel without claiming the
+    same entries, and the locks are released as soon as the claim commits. Claims older than `claim_timeout` are from
+    drainers that died mid way and can be claimed again
+    :param queue_model: model class of the queue, with an `id` and a `claimed_time` field
+    :param batch_size: `int` the max number of entries to claim
+    :param claim_timeout: `int` seconds after which a claim is considered stale
+    :return: `list` of claimed entries
+    """
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=claim_timeout)
+
+    with transaction.atomic():
+        entries = list(
+            queue_model.objects.select_for_update(skip_locked=True)
+            .filter(Q(claimed_time__isnull=True) | Q(claimed_time__lt=stale)).order_by('id')[:batch_size]
+        )
+        queue_model.objects.filter(id__in=[entry.id for entry in entries]).update(claimed_time=now)
+
+    return entries
+
+
+def drain_entries(queue_model, batch_size, claim_timeout, group_key, process_group):
+    """ claims up to `batch_size` entries of a queue table and processes them group by group. Groups are processed
+    outside of the claiming transaction, so no row locks are held while talking to the Sheets API. The entries of a
+    group are deleted once it's processed, and when a group fails the entries not processed yet are released for the
+    next drain before the error propagates
+    :param queue_model: model class of the queue, with an `id` and a `claimed_time` field
+    :param batch_size: `int` the max number of entries to claim
+    :param claim_timeout: `int` seconds after which a claim is considered stale
+    :param group_key: `callable` giving the group of an entry
+    :param process_group: `callable` taking a group key and its `list` of entries
+    :return: `int` the number of entries drained
+    """
+    entries = claim_entries(queue_model, batch_size, claim_timeout)
+    if not entries:
+        return 0
+
+    entries_by_group = {}
+    for entry in entries:
+        entries_by_group.setdefault(group_key(entry), []).append(entry)
+
+    processed_ids = set()
+    try:
+        for key, group_entries in entries_by_group.items():
+            process_group(key, group_entries)
+
+            group_ids = [entry.id for entry in group_entries]
+            queue_model.objects.filter(id__in=group_ids).delete()
+            processed_ids.update(group_ids)
+    except Exception:
+        queue_model.objects.filter(
+            id__in=[entry.id for entry in entries if entry.id not in processed_ids]
+        ).update(claimed_time=None)
+        raise
+
+    return len(entries)
@@ -0,0 +1,116 @@
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.functions import Lower
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RelatedLookup(object):
+    """ a related field synced through a sheet column holding a value of the related object - like the owner's last
+    name for a Car's owner - rather than its primary key. Declared on models as
+    `sheet_related_lookups = {'owner': ('Person', 'last_name__iexact', 'owner_last_name')}`
+    """
+    def __init__(self, model_cls, field_name, related_model, lookup, column):
+        """
+        :param model_cls: `models.Model` subclass the related field belongs to
+        :param field_name: `str` name of the related field
+        :param related_model: `str` model name (in the same app), `str` app label + model name, model class, or None
+        to use the related model of the field
+        :param lookup: `str` the related model field to match the column against, optionally ending in `__exact` or
+        `__iexact`
+        :param column: `str` name of the sheet column holding the lookup value
+        """
+        self.field_name = field_name
+        self.column = column
+
+        if related_model is None:
+            self.related_model = model_cls._meta.get_field(field_name).related_model
+        elif isinstance(related_model, str):
+            label = related_model if '.' in related_model else f'{model_cls._meta.app_label}.{related_model}'
+            self.related_model = apps.get_model(label)
+        else:
+            self.related_model = related_model
+
+        lookup_parts = lookup.split('__')
+        self.case_insensitive = lookup_parts[-1] == 'iexact'
+        if lookup_parts[-1] in ('exact', 'iexact'):
+            lookup_parts = lookup_parts[:-1]
+        elif lookup_parts[-1] in ('contains', 'icontains', 'startswith', 'istartswith', 'in', 'gt', 'lt'):
+            raise ImproperlyConfigured(f'related lookup {lookup} for {field_name} must be an exact or iexact lookup')
+
+        self.lookup_parts = lookup_parts
+        self.lookup_field = '__'.join(lookup_parts)
+
+    @property
+    def select_related(self):
+        """ the `select_related` path needed to render this field's values without extra queries """
+        return '__'.join([self.field_name] + self.lookup_parts[:-1])
+
+    def key(self, value):
+        key = str(value).strip()
+        return key.lower() if self.case_insensitive else key
+
+    def render(self, related_obj):
+        """ gets the value to write to the sheet column for a related object
+        :param related_obj: instance of the related model, or None
+        :return: the lookup value, None if there's no related object
+        """
+        value = related_obj
+        for part in self.lookup_parts:
+            if value is None:
+                return None
+            value = getattr(value, part)
+
+        return value
+
+    def resolve(self, values):
+        """ finds the related objects matching a batch of sheet values with a single query
+        :param values: iterable of sheet values
+        :return: `dict` of lookup key (see `key`) to related object
+        """
+        keys = {self.key(v) for v in values if v not in ('', None)}
+        if not keys:
+            return {}
+
+        queryset = self.related_model._default_manager.all()
+        if self.case_insensitive:
+            queryset = queryset.annotate(gsheets_lookup_key=Lower(self.lookup_field)).filter(gsheets_lookup_key__in=keys)
+        else:
+            queryset = queryset.filter(**{f'{self.lookup_field}__in': keys})
+
+        resolved = {}
+        for related_obj in queryset:
+            resolved.setdefault(self.key(self.render(related_obj)), related_obj)
+
+        return resolved
+
+    def resolve_batch(self, batch_data):
+        """ sets the related field in a batch of cleaned model data from the values in the lookup column of the row
+        data. Rows with an empty value get None, rows whose value matches no related object are left as is
+        :param batch_data: `list` of `two-tuple` of the `dict` of row data and the `dict` of cleaned model data, which
+        is updated in place
+        """
+        rows = [(row_data, cleaned_data) for row_data, cleaned_data in batch_data if self.column in row_data]
+        resolved = self.resolve(row_data[self.column] for row_data, noop in rows)
+
+        for row_data, cleaned_data in rows:
+            value = row_data[self.column]
+            if value in ('', None):
+                cleaned_data[self.field_name] = None
+            elif self.key(value) in resolved:
+                cleaned_data[self.field_name] = resolved[self.key(value)]
+            else:
+                logger.debug(f'no {self.related_model.__name__} matches {self.column} {value}, leaving {self.field_name}')
+
+
+def get_related_lookups(model_cls, related_lookups):
+    """ builds the `RelatedLookup`s declared by a model
+    :param model_cls: `models.Model` subclass
+    :param related_lookups: `dict` of field name to `three-tuple` of related model, lookup and sheet column
+    :return: `list` of `RelatedLookup`
+    """
+    return [
+        RelatedLookup(model_cls, field_name, related_model, lookup, column)
+        for field_name, (related_model, lookup, column) in (related_lookups or {}).items()
+    ]
@@ -8,7 +8,26 @@ import os
 
 DEFAULTS = {
     'CLIENT_SECRETS': os.path.abspath('client_secrets.json'),
-    'SCOPES': ['https://www.googleapis.com/auth/spreadsheets']
+    'SCOPES': ['https://www.googleapis.com/auth/spreadsheets'],
+    # how often (in milliseconds) the write-behind buffer pushes pending model changes
+    'WRITE_BEHIND_INTERVAL': 2000,
+    # the number of pending model changes that triggers an early write-behind flush
+    'WRITE_BEHIND_MAX_ROWS': 500,
+    # shared secret used to sign sheet edit notifications, the edit endpoint is disabled while unset
+    'WEBHOOK_SECRET': None,
+    # lease credentials from every active AccessCredentials row, least recently used first, instead of always using the
+    # most recently authorized account
+    'CREDENTIAL_POOL': False,
+    # how long (in seconds) the credential pool skips credentials after the API rate limited them
+    'CREDENTIAL_COOLDOWN': 60,
+    # alias of the Django cache holding cached sheet reads, shared by every process using the same cache. None (or a
+    # cache with the dummy backend) disables the read cache
+    'CACHE_ALIAS': 'default',
+    # how long (in seconds) outbox entries claimed by a drainer stay claimed before other drainers may claim them again,
+    # in case the drainer died mid push
+    'OUTBOX_CLAIM_TIMEOUT': 600,
+    # how long (in seconds) sheet edits claimed by a drainer stay claimed before other drainers may claim them again
+    'EDIT_CLAIM_TIMEOUT': 600,
 }
 
 # List of settings that may be in string import notation.
@@ -0,0 +1,77 @@
+from collections import namedtuple
+import zlib
+
+# a sheet holding part of a model's rows. A spreadsheet ID of None means the model's own spreadsheet
+SheetShard = namedtuple('SheetShard', ['sheet_name', 'spreadsheet_id'])
+SheetShard.__new__.__defaults__ = (None,)
+
+
+class BaseShardStrategy(object):
+    """ routes the instances of a model across several sheets (and/or spreadsheets), so one model can grow past the
+    limits of a single sheet. Subclasses implement `get_shard_key`
+    """
+    def __init__(self, shards, default=None):
+        """
+        :param shards: `dict` of shard key to `SheetShard` (or sheet name), or a `list` of them keyed by position
+        :param default: key of the shard to use for instances whose key has no shard, None to raise `KeyError`
+        """
+        if not isinstance(shards, dict):
+            shards = dict(enumerate(shards))
+
+        self.shards = {key: shard if isinstance(shard, SheetShard) else SheetShard(shard) for key, shard in shards.items()}
+        self.default = default
+
+    @property
+    def all_shards(self):
+        """ every distinct shard, in declaration order """
+        return list(dict.fromkeys(self.shards.values()))
+
+    def get_shard_key(self, obj, model_cls):
+        raise NotImplementedError('shard strategies must implement get_shard_key')
+
+    def get_shard(self, obj, model_cls):
+        """ gets the shard an instance belongs in
+        :param obj: model instance
+        :param model_cls: `BaseGoogleSheetMixin` model class of the instance
+        :return: `SheetShard`
+        :raises: `KeyError` if the instance has no shard and there's no default
+        """
+        key = self.get_shard_key(obj, model_cls)
+        if key not in self.shards and self.default is not None:
+            key = self.default
+
+        return self.shards[key]
+
+
+class HashShardStrategy(BaseShardStrategy):
+    """ spreads instances evenly across shards by a stable hash of a field, the model ID field by default """
+    def __init__(self, shards, field=None):
+        super(HashShardStrategy, self).__init__(shards)
+        self.field = field
+
+    def get_shard_key(self, obj, model_cls):
+        value = getattr(obj, self.field or model_cls.model_id_field)
+        # crc32 rather than hash() so every process routes a value to the same shard
+        return list(self.shards)[zlib.crc32(str(value).encode('utf-8')) % len(self.shards)]
+
+
+class FieldValueShardStrategy(BaseShardStrategy):
+    """ routes instances by the value of a field, like a region or a category """
+    def __init__(self, field, shards, default=None):
+        super(FieldValueShardStrategy, self).__init__(shards, default=default)
+        self.field = field
+
+    def get_shard_key(self, obj, model_cls):
+        return getattr(obj, self.field)
+
+
+class DateShardStrategy(BaseShardStrategy):
+    """ routes instances by a date or datetime field formatted with `date_format`, like one sheet per year """
+    def __init__(self, field, shards, date_format='%Y', default=None):
+        super(DateShardStrategy, self).__init__(shards, default=default)
+        self.field = field
+        self.date_format = date_format
+
+    def get_shard_key(self, obj, model_cls):
+        value = getattr(obj, self.field)
+        return value.strftime(self.date_format) if value is not None else None
@@ -2,3 +2,7 @@ import django.dispatch
 
 # dispatched when a row has been pulled from a spreadsheet and processed to create or update an instance
 sheet_row_processed = django.dispatch.Signal(providing_args=["instance", "created", "row_data"])
+
+# dispatched once per pulled batch with the instances created or updated from the batch's rows, their created flags
+# and their row data (all lists in the same order)
+sheet_rows_processed = django.dispatch.Signal(providing_args=["instances", "created", "row_data"])
@@ -0,0 +1,25 @@
+import contextlib
+import threading
+
+_state = threading.local()
+
+
+@contextlib.contextmanager
+def syncing():
+    """ marks the saves made in the block, on this thread, as made by a sync pulling rows from a sheet. Handlers
+    queueing pushes of saved instances (write-behind, outbox) skip these saves, so pulled rows aren't echoed back
+    to the sheet they came from
+    """
+    depth = getattr(_state, 'depth', 0)
+    _state.depth = depth + 1
+    try:
+        yield
+    finally:
+        _state.depth = depth
+
+
+def is_syncing():
+    """ checks whether the current thread is saving instances pulled from a sheet
+    :return: `bool`
+    """
+    return getattr(_state, 'depth', 0) > 0
@@ -1,3 +1,1069 @@
-from django.test import TestCase
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, MultipleObjectsReturned, ObjectDoesNotExist
+from django.core.management import call_command
+from django.db import connection, models, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from .gsheets import (
+    BaseSheetInterface, SheetPullInterface, SheetPushInterface, is_permanent_error, is_rate_limit_error,
+    rotate_rate_limited_credentials
+)
+from .columnar import ColumnarSheetData, rows_memory_usage
+from .values import ValuePlan, datetime_to_serial, serial_to_datetime
+from .writebehind import WriteBehindBuffer, buffer_saved_instance
+from .models import AccessCredentials, SheetEdit, SheetOutbox, SheetRevision, SyncCheckpoint
+from .clients import SheetClients, lease_access_credentials
+from .related import RelatedLookup
+from .sharding import DateShardStrategy, FieldValueShardStrategy, HashShardStrategy, SheetShard
+from .mixins import SheetPushableMixin
+from .fanout import fan_out
+from .query import SheetQuerySet, get_memoized_query
+from .outbox import drain_outbox, record_saved_instance
+from .edits import drain_sheet_edits
+from .queues import claim_entries
+from .syncing import syncing
+from . import cache, decorators, writebehind
+from decimal import Decimal
+from types import SimpleNamespace
+import datetime
+import functools
+import hashlib
+import hmac
+import io
+import json
+import threading
+import subprocess
+import sys
+import unittest
+from unittest import mock
 
-# Create your tests here.
+# the Google client libraries and their transports, which are only imported once a sync talks to the API
+GOOGLE_MODULES = ('google', 'googleapiclient', 'google_auth_oauthlib', 'google_auth_httplib2', 'httplib2', 'oauthlib')
+
+
+class ImportTimeTestCase(SimpleTestCase):
+    # setting Django up and loading the gsheets models, mixins and URLs mustn't import the Google libraries
+    startup_code = 'import gsheets, django; django.setup(); import gsheets.mixins, gsheets.urls, gsheets.views'
+
+    def run_python(self, *args):
+        result = subprocess.run(
+            [sys.executable] + list(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+        return result
+
+    def assertNoGoogleModules(self, modules):
+        self.assertEqual([m for m in modules if m.split('.')[0] in GOOGLE_MODULES], [])
+
+    def test_startup_doesnt_load_google_libraries(self):
+        """ works on every python, checking the modules loaded once startup is done """
+        result = self.run_python('-c', self.startup_code + '; import sys; print("\\n".join(sys.modules))')
+        loaded = result.stdout.splitlines()
+
+        self.assertIn('gsheets.mixins', loaded)
+        self.assertNoGoogleModules(loaded)
+
+    @unittest.skipIf(sys.version_info < (3, 7), '-X importtime needs python 3.7+')
+    def test_startup_doesnt_import_google_libraries(self):
+        """ also catches modules imported during startup and dropped from sys.modules afterwards """
+        result = self.run_python('-X', 'importtime', '-c', self.startup_code)
+
+        # -X importtime reports 'import time: <self us> | <cumulative us> | <indented module name>' on stderr
+        imported = [line.split('|')[-1].strip() for line in result.stderr.splitlines() if line.startswith('import time:')]
+
+        self.assertIn('gsheets.mixins', imported)
+        self.assertNoGoogleModules(imported)
+
+
+def get_fake_model(*fields, label='gsheets.Fake'):
+    """ builds the bare minimum of a model class a `ValuePlan` compiles from """
+    return SimpleNamespace(_meta=SimpleNamespace(concrete_fields=list(fields), fields=list(fields), label=label))
+
+
+class ValuePlanTestCase(SimpleTestCase):
+    def setUp(self):
+        self.plan = ValuePlan(get_fake_model(
+            models.DateField(name='date'), models.DateTimeField(name='datetime'), models.TimeField(name='time'),
+            models.DecimalField(name='decimal', max_digits=10, decimal_places=2), models.BooleanField(name='bool'),
+        ))
+
+    def assertRoundTrips(self, field, value):
+        self.assertEqual(self.plan.parse(field, ValuePlan.serialize(value)), value)
+
+    def test_serial_dates(self):
+        self.assertEqual(serial_to_datetime(43831), datetime.datetime(2020, 1, 1))
+        self.assertEqual(serial_to_datetime(43831.75), datetime.datetime(2020, 1, 1, 18))
+        self.assertEqual(datetime_to_serial(datetime.date(2020, 1, 1)), 43831)
+        self.assertEqual(datetime_to_serial(datetime.datetime(2020, 1, 1, 18)), 43831.75)
+
+    def test_date_round_trip(self):
+        self.assertRoundTrips('date', datetime.date(2020, 2, 29))
+        self.assertRoundTrips('date', datetime.date(1899, 12, 30))
+
+    @override_settings(USE_TZ=False)
+    def test_datetime_round_trip(self):
+        self.assertRoundTrips('datetime', datetime.datetime(2020, 1, 2, 3, 4, 5))
+
+    @override_settings(USE_TZ=True, TIME_ZONE='UTC')
+    def test_aware_datetime_round_trip(self):
+        self.assertRoundTrips('datetime', datetime.datetime(2020, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc))
+
+    def test_time_round_trip(self):
+        self.assertRoundTrips('time', datetime.time(13, 45, 30))
+        self.assertRoundTrips('time', datetime.time(0, 0))
+
+    def test_decimal_round_trip(self):
+        self.assertRoundTrips('decimal', Decimal('12.34'))
+        self.assertEqual(self.plan.parse('decimal', '1,234.50'), Decimal('1234.50'))
+
+    def test_bool_round_trip(self):
+        self.assertRoundTrips('bool', True)
+        self.assertRoundTrips('bool', False)
+        self.assertIs(self.plan.parse('bool', 'yes'), True)
+
+    def test_unparseable_values_are_left_as_is(self):
+        self.assertEqual(self.plan.parse('date', 'next tuesday'), 'next tuesday')
+        self.assertEqual(self.plan.parse('datetime', 'not a datetime'), 'not a datetime')
+        self.assertEqual(self.plan.parse('time', '25:99'), '25:99')
+        self.assertEqual(self.plan.parse('decimal', 'n/a'), 'n/a')
+        self.assertEqual(self.plan.parse('bool', 'maybe'), 'maybe')
+
+
+class WriteoutCellsTestCase(SimpleTestCase):
+    def get_interface(self, data_range):
+        """ builds an interface whose grid requests are collected in `self.requests` instead of being sent """
+        self.requests = []
+        interface = BaseSheetInterface(
+            get_fake_model(), 'spreadsheet', sheet_name='Sheet1', data_range=data_range, max_rows=100, max_col='Z'
+        )
+        interface._grid_sheet_id = 7
+        interface.writeout_grid_requests = self.requests.extend
+
+        return interface
+
+    def test_cells_map_to_grid_coordinates(self):
+        """ data row 0 is the row under the header, and adjacent cells of a row are merged into one request """
+        self.get_interface('A1:Z').writeout_cells([(4, 0, 5), (0, 3, 'y'), (0, 2, 'x')])
+
+        self.assertEqual(self.requests, [
+            {'updateCells': {
+                'start': {'sheetId': 7, 'rowIndex': 1, 'columnIndex': 2},
+                'rows': [{'values': [
+                    {'userEnteredValue': {'stringValue': 'x'}}, {'userEnteredValue': {'stringValue': 'y'}}
+                ]}],
+                'fields': 'userEnteredValue'
+            }},
+            {'updateCells': {
+                'start': {'sheetId': 7, 'rowIndex': 5, 'columnIndex': 0},
+                'rows': [{'values': [{'userEnteredValue': {'numberValue': 5}}]}],
+                'fields': 'userEnteredValue'
+            }},
+        ])
+
+    def test_cells_are_offset_by_the_data_range(self):
+        """ with the header on sheet row 3 from column C, data row 0 is grid row 3 and data column 0 grid column 2 """
+        self.get_interface('C3:F').writeout_cells([(0, 0, '12'), (2, 1, True)])
+
+        starts = [request['updateCells']['start'] for request in self.requests]
+        self.assertEqual(starts, [
+            {'sheetId': 7, 'rowIndex': 3, 'columnIndex': 2}, {'sheetId': 7, 'rowIndex': 5, 'columnIndex': 3}
+        ])
+
+    def test_appended_rows_are_padded_to_the_data_range(self):
+        self.get_interface('C3:F').writeout_appended_rows([['a', None, 1]])
+
+        self.assertEqual(self.requests, [{'appendCells': {
+            'sheetId': 7,
+            'rows': [{'values': [
+                {}, {}, {'userEnteredValue': {'stringValue': 'a'}}, {}, {'userEnteredValue': {'numberValue': 1}}
+            ]}],
+            'fields': 'userEnteredValue'
+        }}])
+
+
+class UpsertTableTestCase(SimpleTestCase):
+    def test_rows_are_written_as_cell_data(self):
+        """ existing rows are rewritten with updateCells and new ones appended, both storing values as they are """
+        requests = []
+        instances = [SimpleNamespace(id=2, name='b', active=True), SimpleNamespace(id=3, name='c', active=False)]
+        interface = SheetPushInterface(
+            get_fake_model(), 'spreadsheet', sheet_name='Sheet1', data_range='A1:Z', max_rows=100, max_col='Z',
+            model_id_field='id', sheet_id_field='Django GUID', batch_size=500, queryset=instances,
+            push_fields=['id', 'name', 'active']
+        )
+        interface._sheet_headers = ['Django GUID', 'name', 'active']
+        interface._sheet_data = [['1', 'a', 'TRUE'], ['2', 'x', 'TRUE']]
+        interface._grid_sheet_id = 7
+        interface.writeout_grid_requests = requests.extend
+
+        interface.upsert_table()
+
+        row = {'values': [
+            {'userEnteredValue': {'numberValue': 3}}, {'userEnteredValue': {'stringValue': 'c'}},
+            {'userEnteredValue': {'boolValue': False}}
+        ]}
+        self.assertEqual(requests, [
+            {'appendCells': {'sheetId': 7, 'rows': [row], 'fields': 'userEnteredValue'}},
+            {'updateCells': {
+                'start': {'sheetId': 7, 'rowIndex': 2, 'columnIndex': 0},
+                'rows': [{'values': [
+                    {'userEnteredValue': {'numberValue': 2}}, {'userEnteredValue': {'stringValue': 'b'}},
+                    {'userEnteredValue': {'boolValue': True}}
+                ]}],
+                'fields': 'userEnteredValue'
+            }},
+        ])
+
+
+class ColumnarSheetDataTestCase(SimpleTestCase):
+    def test_ragged_rows_read_back_as_given(self):
+        rows = [['1', 'a', 'b'], ['2'], [], ['3', None, 'c', 'd']]
+        data = ColumnarSheetData(rows)
+
+        self.assertEqual(len(data), 4)
+        self.assertEqual(list(data), rows)
+        self.assertEqual(data[1], ['2'])
+        self.assertEqual(data[-1], ['3', None, 'c', 'd'])
+        self.assertEqual(data[1:3], [['2'], []])
+        with self.assertRaises(IndexError):
+            data[4]
+
+    def test_rows_can_be_replaced_and_appended(self):
+        data = ColumnarSheetData([['1', 'a'], ['2', 'b', 'c']])
+
+        data[0] = ['1', 'x', 'y', 'z']
+        data[-1] = ['2']
+        data.append(['3', 'a', 'b', 'c', 'd'])
+
+        self.assertEqual(list(data), [['1', 'x', 'y', 'z'], ['2'], ['3', 'a', 'b', 'c', 'd']])
+        with self.assertRaises(IndexError):
+            data[3] = ['4']
+
+    def test_columns_have_none_for_short_rows(self):
+        data = ColumnarSheetData([['1', 'a', 'b'], ['2'], ['3', 'c']])
+
+        self.assertEqual(data.column(0), ['1', '2', '3'])
+        self.assertEqual(data.column(2), ['b', None, None])
+        self.assertEqual(data.column(5), [None, None, None])
+
+    def test_wide_sheet_takes_less_memory_than_rows(self):
+        """ the cells of a wide sheet with few distinct values per column are held once instead of once per row """
+        # round trip through JSON like API responses do, so equal cells are distinct string objects
+        rows = json.loads(json.dumps([
+            [str(i)] + [f'value {c} {i % 5}' for c in range(1, 26)] for i in range(2000)
+        ]))
+
+        self.assertLess(ColumnarSheetData(rows).memory_usage(), rows_memory_usage(rows) / 4)
+
+
+class ChangedCellsTestCase(SimpleTestCase):
+    def test_unchanged_typed_cells_read_formatted_are_skipped(self):
+        """ booleans, numbers, dates and times read back formatted still match the values they were pushed as """
+        sheet_row = ['TRUE', '1,234.50', '1.5', '2020-01-31', '13:45:30', '', '7', 'x']
+        row_data = [
+            True, Decimal('1234.5'), 1.5, datetime.date(2020, 1, 31), datetime.time(13, 45, 30), '', 7, 'x'
+        ]
+
+        self.assertEqual(SheetPushInterface.changed_cells(3, sheet_row, row_data), [])
+
+    def test_unchanged_cells_read_unformatted_are_skipped(self):
+        sheet_row = [True, 1234.5, 43861, 'x', 7]
+        row_data = [True, Decimal('1234.50'), datetime.date(2020, 1, 31), 'x', '7']
+
+        self.assertEqual(SheetPushInterface.changed_cells(3, sheet_row, row_data), [])
+
+    def test_changed_cells_are_found(self):
+        sheet_row = ['FALSE', '1,234.50', '2020-01-31', 'x', '1']
+        row_data = [True, Decimal('1234.51'), datetime.date(2020, 2, 1), 'y', '01', 'new']
+
+        self.assertEqual(SheetPushInterface.changed_cells(3, sheet_row, row_data), [
+            (3, 0, True), (3, 1, Decimal('1234.51')), (3, 2, datetime.date(2020, 2, 1)), (3, 3, 'y'), (3, 4, '01'),
+            (3, 5, 'new'),
+        ])
+
+    def test_unpushed_columns_are_left_alone(self):
+        self.assertEqual(SheetPushInterface.changed_cells(0, ['a', 'b'], [None, 'b', None]), [])
+
+
+class FakeRequest(object):
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class FakeSheetsApi(object):
+    """ stands in for a Sheets API client, answering `values().batchGet` with the columns of `columns` and recording
+    the ranges asked for
+    """
+    def __init__(self, columns):
+        self.columns = columns
+        self.ranges = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def batchGet(self, ranges=(), **kwargs):
+        self.ranges += ranges
+        return FakeRequest({'valueRanges': [{'values': [self.columns[r.split('!')[1][0]]]} for r in ranges]})
+
+
+class ReadColumnsTestCase(SimpleTestCase):
+    def get_interface(self, data_range, columns):
+        interface = BaseSheetInterface(
+            get_fake_model(), 'spreadsheet', sheet_name='Sheet1', data_range=data_range, max_rows=4, max_col='Z'
+        )
+        interface._api = FakeSheetsApi(columns)
+
+        return interface
+
+    def read_columns(self, interface, column_indexes):
+        # skip the retrying wrapper, which imports the Google client library
+        return BaseSheetInterface.read_columns.__wrapped__(interface, column_indexes)
+
+    def test_open_ended_range_reads_past_max_rows(self):
+        interface = self.get_interface('A1:Z', {'A': ['1', '2', '3', '4', '5', '6', '7'], 'C': ['x']})
+
+        self.assertEqual(self.read_columns(interface, [0, 2]), [['1', '2', '3', '4', '5', '6', '7'], ['x']])
+        self.assertEqual(interface.api.ranges, ['Sheet1!A2:A', 'Sheet1!C2:C'])
+
+    def test_bounded_range_keeps_its_end_row(self):
+        interface = self.get_interface('B3:F10', {'C': ['1']})
+
+        self.read_columns(interface, [1])
+        self.assertEqual(interface.api.ranges, ['Sheet1!C4:C10'])
+
+    def test_selected_columns_pull_reads_past_max_rows(self):
+        """ a narrowed pull of an open-ended range gets every row, with the pulled cells at their sheet column """
+        interface = SheetPullInterface(
+            get_fake_model(), 'spreadsheet', sheet_name='Sheet1', data_range='A1:Z', max_rows=4, max_col='Z',
+            pull_fields=['Django GUID', 'make']
+        )
+        interface._api = FakeSheetsApi({'A': ['1', '2', '3', '4', '5', '6'], 'C': ['Ford', '', 'Kia']})
+        interface.read_header_row = lambda: ['Django GUID', 'notes', 'make']
+        interface.read_columns = functools.partial(BaseSheetInterface.read_columns.__wrapped__, interface)
+
+        self.assertEqual(interface.sheet_data, [
+            ['1', None, 'Ford'], ['2', None, ''], ['3', None, 'Kia'], ['4'], ['5'], ['6']
+        ])
+        self.assertEqual(interface.api.ranges, ['Sheet1!A2:A', 'Sheet1!C2:C'])
+
+
+class FakePushModel(object):
+    """ stands in for a `SheetPushableMixin` model, recording the pushes it's asked for """
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.pushes = []
+
+    def push_rows_to_sheet(self, pks, clients=None):
+        if self.fail:
+            raise ValueError('push failed')
+
+        self.pushes.append((pks, clients))
+
+
+class WriteBehindTestCase(SimpleTestCase):
+    # on_commit runs the buffering callback right away outside of a transaction, which takes a DB connection
+    databases = {'default'}
+
+    def setUp(self):
+        self.buffer = WriteBehindBuffer()
+        # flushes are run by the tests instead of the background thread
+        self.buffer._ensure_thread = lambda: None
+        self.model = FakePushModel()
+
+    def pushed_pks(self):
+        return [pks for pks, clients in self.model.pushes]
+
+    def test_repeated_saves_are_pushed_once(self):
+        for pk in (1, 2, 1, 1):
+            self.buffer.add(self.model, pk)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.pushed_pks(), [[1, 2]])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_deleted_instances_are_discarded(self):
+        self.buffer.add(self.model, 1)
+        self.buffer.add(self.model, 2)
+        self.buffer.discard(self.model, 1)
+
+        self.buffer.flush()
+        self.assertEqual(self.pushed_pks(), [[2]])
+
+    def test_failed_flush_is_restored(self):
+        """ the changes of a failed flush are pushed by the next one, ahead of the changes buffered since """
+        self.model.fail = True
+        self.buffer.add(self.model, 1)
+        self.buffer.add(self.model, 2)
+        with self.assertLogs('gsheets.writebehind', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(len(self.buffer), 2)
+
+        self.buffer.add(self.model, 3)
+        self.model.fail = False
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(self.pushed_pks(), [[1, 2, 3]])
+
+    def test_flushes_share_clients(self):
+        self.buffer.add(self.model, 1)
+        self.buffer.flush()
+        self.buffer.add(self.model, 2)
+        self.buffer.flush()
+
+        (noop, first_clients), (noop, second_clients) = self.model.pushes
+        self.assertIsNotNone(first_clients)
+        self.assertIs(first_clients, second_clients)
+
+    def test_saves_made_by_syncs_are_not_buffered(self):
+        """ instances saved by a pull are already in line with the sheet, pushing them back would echo the pull """
+        with mock.patch.object(writebehind, 'write_behind_buffer', self.buffer):
+            buffer_saved_instance(self.model, instance=SimpleNamespace(pk=1))
+            with syncing():
+                buffer_saved_instance(self.model, instance=SimpleNamespace(pk=2))
+
+        self.buffer.flush()
+        self.assertEqual(self.pushed_pks(), [[1]])
+
+
+class OutboxTestCase(TestCase):
+    def setUp(self):
+        self.model = FakePushModel()
+        patcher = mock.patch('gsheets.outbox.apps.get_model', return_value=self.model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def queue(self, *object_ids):
+        return [SheetOutbox.objects.create(model='sample.Car', object_id=str(object_id)) for object_id in object_ids]
+
+    def test_claimed_entries_are_not_claimed_again(self):
+        first = self.queue(1, 2, 3)
+
+        self.assertEqual(claim_entries(SheetOutbox, 2, 600), first[:2])
+        self.assertEqual(claim_entries(SheetOutbox, 2, 600), first[2:])
+        self.assertEqual(claim_entries(SheetOutbox, 2, 600), [])
+
+    def test_stale_claims_are_claimed_again(self):
+        """ entries claimed by a drainer that died are claimed again once their claim timed out """
+        entry, = self.queue(1)
+        SheetOutbox.objects.update(claimed_time=timezone.now() - datetime.timedelta(seconds=60))
+
+        self.assertEqual(claim_entries(SheetOutbox, 10, 600), [])
+        self.assertEqual(claim_entries(SheetOutbox, 10, 30), [entry])
+
+    def test_pushed_entries_are_deleted(self):
+        self.queue(1, 2, 1)
+
+        self.assertEqual(drain_outbox(10), 3)
+        self.assertEqual(self.model.pushes, [(['1', '2'], None)])
+        self.assertFalse(SheetOutbox.objects.exists())
+
+    def test_entries_of_failed_pushes_are_released(self):
+        self.queue(1, 2)
+        self.model.fail = True
+
+        with self.assertRaises(ValueError):
+            drain_outbox(10)
+
+        self.assertEqual(SheetOutbox.objects.filter(claimed_time__isnull=True).count(), 2)
+
+    def test_drain_command(self):
+        self.queue(1, 2)
+        out = io.StringIO()
+
+        call_command('drainsheetoutbox', '--batch-size=1', stdout=out)
+        self.assertIn('Successfully drained 2 outbox entries', out.getvalue())
+        self.assertEqual(self.model.pushes, [(['1'], None), (['2'], None)])
+
+    def test_saves_made_by_syncs_are_not_queued(self):
+        sender = SimpleNamespace(_meta=SimpleNamespace(label='sample.Car'))
+        record_saved_instance(sender, instance=SimpleNamespace(pk=1))
+        record_saved_instance(sender, instance=SimpleNamespace(pk=2), raw=True)
+        with syncing():
+            record_saved_instance(sender, instance=SimpleNamespace(pk=3))
+
+        self.assertEqual(list(SheetOutbox.objects.values_list('object_id', flat=True)), ['1'])
+
+
+class SheetEditsTestCase(TestCase):
+    def test_pulled_edits_are_deleted(self):
+        model = mock.Mock()
+        for row in (5, 2, 5):
+            SheetEdit.objects.create(spreadsheet_id='spreadsheet', sheet_name='Sheet1', row=row)
+
+        with mock.patch('gsheets.edits.get_pullable_models', return_value=[model]):
+            self.assertEqual(drain_sheet_edits(10), 3)
+
+        model.pull_sheet_rows.assert_called_once_with([2, 5], location=('spreadsheet', 'Sheet1'))
+        self.assertFalse(SheetEdit.objects.exists())
+
+
+@unittest.skipUnless(connection.features.has_select_for_update_skip_locked, 'the database can\'t skip locked rows')
+class SkipLockedClaimTestCase(TransactionTestCase):
+    def test_entries_locked_by_another_drainer_are_skipped(self):
+        """ an entry row locked by another drainer's claiming transaction is skipped instead of waited for """
+        locked, free = [SheetOutbox.objects.create(model='sample.Car', object_id=str(pk)) for pk in (1, 2)]
+        is_locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    list(SheetOutbox.objects.select_for_update().filter(id=locked.id))
+                    is_locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            is_locked.wait(10)
+            self.assertEqual(claim_entries(SheetOutbox, 10, 600), [free])
+        finally:
+            release.set()
+            thread.join()
+
+
+@override_settings(ROOT_URLCONF='gsheets.urls', GSHEETS={'WEBHOOK_SECRET': 'secret'})
+class SheetEditViewTestCase(TestCase):
+    def post(self, payload, signature=None):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        if signature is None:
+            signature = hmac.new(b'secret', body, hashlib.sha256).hexdigest()
+
+        return self.client.post(
+            '/gsheets/sheet-edits/', body, content_type='application/json', HTTP_X_GSHEETS_SIGNATURE=signature
+        )
+
+    def test_edited_rows_are_queued(self):
+        response = self.post({'spreadsheet_id': 'spreadsheet', 'sheet_name': 'Sheet1', 'rows': [5, '2', 5]})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'queued': 2})
+        self.assertEqual(list(SheetEdit.objects.order_by('row').values_list('row', flat=True)), [2, 5])
+
+    def test_bad_signature_is_rejected(self):
+        with self.assertLogs('gsheets.views', 'WARNING'):
+            response = self.post({'spreadsheet_id': 'spreadsheet', 'sheet_name': 'Sheet1', 'rows': [2]}, 'forged')
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(SheetEdit.objects.exists())
+
+    def test_malformed_bodies_are_rejected(self):
+        payloads = [
+            b'not json', [], {'spreadsheet_id': 'spreadsheet', 'rows': [2]},
+            {'spreadsheet_id': 'spreadsheet', 'sheet_name': 'Sheet1', 'rows': 2},
+            {'spreadsheet_id': 'spreadsheet', 'sheet_name': '', 'rows': [2]},
+            {'spreadsheet_id': 'spreadsheet', 'sheet_name': 'Sheet1', 'rows': [0]},
+            {'spreadsheet_id': 'spreadsheet', 'sheet_name': 'Sheet1', 'rows': [-3]},
+            {'spreadsheet_id': 'spreadsheet', 'sheet_name': 'Sheet1', 'rows': [2 ** 40]},
+            {'spreadsheet_id': 'spreadsheet', 'sheet_name': 'Sheet1', 'rows': [2.5]},
+            {'spreadsheet_id': 'spreadsheet', 'sheet_name': 'Sheet1', 'rows': ['two']},
+            {'spreadsheet_id': 'spreadsheet', 'sheet_name': 'Sheet1', 'rows': [True]},
+        ]
+
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+
+        self.assertFalse(SheetEdit.objects.exists())
+
+
+class RelatedLookupTestCase(TestCase):
+    def setUp(self):
+        self.alpha, self.beta = [
+            SheetRevision.objects.create(model='sample.Car', spreadsheet_id='spreadsheet', sheet_name=name, revision='1')
+            for name in ('Alpha', 'Beta')
+        ]
+
+    def get_lookup(self, lookup):
+        # the related model is given as a class, so the model the lookup is declared on isn't looked at
+        return RelatedLookup(None, 'revision', SheetRevision, lookup, 'revision_sheet')
+
+    def resolve_batch(self, lookup, values):
+        batch_data = [({'revision_sheet': value}, {'revision': 'unchanged'}) for value in values]
+        lookup.resolve_batch(batch_data)
+
+        return [cleaned_data['revision'] for noop, cleaned_data in batch_data]
+
+    def test_batch_is_resolved_with_one_query(self):
+        """ empty cells clear the relation and values matching nothing leave it as it was """
+        lookup = self.get_lookup('sheet_name__iexact')
+        with self.assertNumQueries(1):
+            resolved = self.resolve_batch(lookup, [' alpha', 'BETA', '', 'Gamma', 'Alpha'])
+
+        self.assertEqual(resolved, [self.alpha, self.beta, None, 'unchanged', self.alpha])
+
+    def test_exact_lookups_are_case_sensitive(self):
+        resolved = self.resolve_batch(self.get_lookup('sheet_name'), ['alpha', 'Beta'])
+
+        self.assertEqual(resolved, ['unchanged', self.beta])
+
+    def test_batch_without_values_runs_no_query(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolve_batch(self.get_lookup('sheet_name__iexact'), ['', None]), [None, None])
+
+    def test_lookups_spanning_relations_render_and_select_related(self):
+        lookup = RelatedLookup(None, 'car', SheetRevision, 'owner__last_name__iexact', 'owner_last_name')
+        car = SimpleNamespace(owner=SimpleNamespace(last_name='Smith'))
+
+        self.assertEqual(lookup.select_related, 'car__owner')
+        self.assertEqual(lookup.render(car), 'Smith')
+        self.assertIsNone(lookup.render(SimpleNamespace(owner=None)))
+        self.assertIsNone(lookup.render(None))
+
+    def test_inexact_lookups_are_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.get_lookup('sheet_name__icontains')
+
+
+class CheckpointTestCase(TestCase):
+    rows = [['1', 'a'], ['2', 'b'], ['3', 'c'], ['4', 'd'], ['5', 'e']]
+
+    def get_interface(self, headers=('Django GUID', 'name'), fail_on_row=None):
+        """ builds a resumable pull interface over `rows` whose upserted rows are collected in `self.upserted`, and which
+        fails upserting the batch holding the row with index `fail_on_row`
+        """
+        self.upserted = []
+        interface = SheetPullInterface(
+            get_fake_model(), 'spreadsheet', sheet_name='Sheet1', data_range='A1:Z', max_rows=100, max_col='Z',
+            sheet_id_field='Django GUID', batch_size=2, resumable=True
+        )
+        interface._sheet_headers = list(headers)
+        interface._sheet_data = list(self.rows)
+        interface.prepare_batch = lambda batch, field_indexes: batch
+
+        def upsert_batch(batch):
+            if any(row_ix == fail_on_row for row_ix, row in batch):
+                raise ValueError('upsert failed')
+            self.upserted += [row_ix for row_ix, row in batch]
+            return [row for row_ix, row in batch]
+
+        interface.upsert_batch = upsert_batch
+
+        return interface
+
+    def test_failed_pull_resumes_after_its_last_batch(self):
+        with self.assertRaises(ValueError):
+            self.get_interface(fail_on_row=2).pull_sheet()
+        self.assertEqual(self.upserted, [0, 1])
+        self.assertEqual(SyncCheckpoint.objects.get().position, 2)
+
+        self.get_interface().pull_sheet()
+        self.assertEqual(self.upserted, [2, 3, 4])
+        self.assertFalse(SyncCheckpoint.objects.exists())
+
+    def test_pull_starts_over_when_the_headers_changed(self):
+        with self.assertRaises(ValueError):
+            self.get_interface(fail_on_row=4).pull_sheet()
+
+        self.get_interface(headers=('Django GUID', 'name', 'notes')).pull_sheet()
+        self.assertEqual(self.upserted, [0, 1, 2, 3, 4])
+
+    def test_pull_starts_over_when_the_sheet_shrank(self):
+        with self.assertRaises(ValueError):
+            self.get_interface(fail_on_row=4).pull_sheet()
+
+        interface = self.get_interface()
+        interface._sheet_data = self.rows[:3]
+        interface.pull_sheet()
+        self.assertEqual(self.upserted, [0, 1, 2])
+
+    def test_failed_append_push_resumes_after_its_last_written_batch(self):
+        instances = [SimpleNamespace(id=i, name=name) for i, name in enumerate('abcde', start=1)]
+        written = []
+
+        def get_interface(fail_on_id=None):
+            interface = SheetPushInterface(
+                get_fake_model(), 'spreadsheet', sheet_name='Sheet1', data_range='A1:Z', max_rows=100, max_col='Z',
+                model_id_field='id', sheet_id_field='Django GUID', batch_size=2, resumable=True, queryset=instances,
+                push_fields=['id', 'name'], append_new_rows=True
+            )
+            interface._sheet_headers = ['Django GUID', 'name']
+            interface._sheet_data = []
+
+            def writeout_rows(new_rows, changed_cells):
+                if any(row[0] == fail_on_id for row in new_rows):
+                    raise ValueError('writeout failed')
+                written.extend(row[0] for row in new_rows)
+
+            interface.writeout_rows = writeout_rows
+            return interface
+
+        with self.assertRaises(ValueError):
+            get_interface(fail_on_id=3).append_table()
+        self.assertEqual(written, [1, 2])
+        self.assertEqual(SyncCheckpoint.objects.get(direction='push').position, 2)
+
+        get_interface().append_table()
+        self.assertEqual(written, [1, 2, 3, 4, 5])
+        self.assertFalse(SyncCheckpoint.objects.exists())
+
+
+class OrderedList(list):
+    """ stands in for an ordered queryset """
+    ordered = True
+
+
+class ShardedModel(SheetPushableMixin):
+    spreadsheet_id = 'spreadsheet'
+    sheet_shard_strategy = DateShardStrategy('purchased_on', {'2019': 'Cars 2019', '2020': 'Cars 2020'})
+    _meta = get_fake_model()._meta
+
+
+class ShardStrategyTestCase(SimpleTestCase):
+    def test_hash_sharding_is_stable_and_spread(self):
+        strategy = HashShardStrategy(['A', 'B', 'C'])
+        model = SimpleNamespace(model_id_field='id')
+        shards = [strategy.get_shard(SimpleNamespace(id=i), model).sheet_name for i in range(300)]
+
+        # crc32 rather than hash() routes every value the same way in every process and on every run
+        self.assertEqual(shards[:8], ['C', 'C', 'B', 'B', 'B', 'B', 'B', 'A'])
+        for name in 'ABC':
+            self.assertGreater(shards.count(name), 70)
+
+    def test_hash_sharding_by_field(self):
+        strategy = HashShardStrategy(['A', 'B'], field='email')
+        model = SimpleNamespace(model_id_field='id')
+
+        self.assertEqual(
+            strategy.get_shard(SimpleNamespace(id=1, email='a@b.c'), model),
+            strategy.get_shard(SimpleNamespace(id=2, email='a@b.c'), model)
+        )
+
+    def test_field_value_sharding(self):
+        strategy = FieldValueShardStrategy('region', {
+            'eu': 'Europe', 'us': SheetShard('Americas', spreadsheet_id='other')
+        }, default='us')
+
+        self.assertEqual(strategy.get_shard(SimpleNamespace(region='eu'), None), SheetShard('Europe'))
+        self.assertEqual(strategy.get_shard(SimpleNamespace(region='apac'), None), SheetShard('Americas', 'other'))
+        self.assertEqual(strategy.all_shards, [SheetShard('Europe'), SheetShard('Americas', 'other')])
+
+    def test_date_sharding(self):
+        strategy = DateShardStrategy('purchased_on', {'2019-12': 'December', '2020-01': 'January'}, date_format='%Y-%m')
+
+        self.assertEqual(
+            strategy.get_shard(SimpleNamespace(purchased_on=datetime.date(2020, 1, 31)), None), SheetShard('January')
+        )
+        with self.assertRaises(KeyError):
+            strategy.get_shard(SimpleNamespace(purchased_on=None), None)
+
+        strategy.default = '2019-12'
+        self.assertEqual(strategy.get_shard(SimpleNamespace(purchased_on=None), None), SheetShard('December'))
+
+    def test_push_skips_instances_without_a_shard(self):
+        cars = [
+            SimpleNamespace(pk=1, purchased_on=datetime.date(2019, 5, 1)),
+            SimpleNamespace(pk=2, purchased_on=None),
+            SimpleNamespace(pk=3, purchased_on=datetime.date(2020, 5, 1)),
+            SimpleNamespace(pk=4, purchased_on=datetime.date(2019, 7, 1)),
+        ]
+
+        with self.assertLogs('gsheets.mixins', 'WARNING'):
+            interfaces = ShardedModel.get_target_push_interfaces(OrderedList(cars), 'spreadsheet')
+
+        self.assertEqual(
+            {interface.sheet_name: [car.pk for car in interface.queryset] for interface in interfaces},
+            {'Cars 2019': [1, 4], 'Cars 2020': [3]}
+        )
+
+
+class TenantModel(SheetPushableMixin):
+    sheet_name = 'Cars'
+    _meta = get_fake_model()._meta
+
+    @classmethod
+    def get_sheet_targets(cls):
+        return [('customer-1', {'customer_id': 1}), ('customer-2', {'customer_id': 2})]
+
+
+class FanOutTestCase(SimpleTestCase):
+    def test_calls_run_in_parallel_and_return_in_order(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def call(item):
+            # only returns once 3 calls run at the same time
+            barrier.wait()
+            return item * 2
+
+        self.assertEqual(fan_out(call, [1, 2, 3], 3), [2, 4, 6])
+
+    def test_single_worker_calls_in_place(self):
+        threads = fan_out(lambda item: threading.current_thread(), [1, 2], 1)
+
+        self.assertEqual(threads, [threading.current_thread()] * 2)
+
+    def test_errors_propagate_once_every_call_is_done(self):
+        done = []
+
+        def call(item):
+            if item == 1:
+                raise ValueError('call failed')
+            done.append(item)
+
+        with self.assertRaises(ValueError):
+            fan_out(call, [1, 2, 3], 2)
+        self.assertEqual(sorted(done), [2, 3])
+
+    def test_each_target_spreadsheet_is_a_location(self):
+        self.assertEqual(TenantModel.get_sheet_locations(), {
+            ('customer-1', 'Cars'): {'customer_id': 1}, ('customer-2', 'Cars'): {'customer_id': 2}
+        })
+
+    def test_shards_live_in_each_target(self):
+        strategy = FieldValueShardStrategy('region', {'eu': 'Europe', 'us': SheetShard('Americas', 'shared')})
+
+        with mock.patch.object(TenantModel, 'sheet_shard_strategy', strategy):
+            self.assertEqual(set(TenantModel.get_sheet_locations()), {
+                ('customer-1', 'Europe'), ('customer-2', 'Europe'), ('shared', 'Americas')
+            })
+
+    def test_rows_created_from_a_target_get_its_filter_values(self):
+        interface = SheetPullInterface(
+            get_fake_model(), 'customer-1', sheet_name='Cars', queryset_filter={'customer_id': 1, 'owner__region': 'eu'}
+        )
+
+        self.assertEqual(interface.create_defaults, {'customer_id': 1})
+
+
+class FakeHttpError(Exception):
+    """ stands in for a Google API `HttpError` """
+    def __init__(self, status, content=b''):
+        super(FakeHttpError, self).__init__(f'HTTP {status}')
+        self.resp = SimpleNamespace(status=status)
+        self.content = content
+
+
+@override_settings(GSHEETS={'CREDENTIAL_POOL': True, 'CREDENTIAL_COOLDOWN': 60})
+class CredentialPoolTestCase(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        # a was leased longest ago, c most recently
+        self.a, self.b, self.c = [
+            AccessCredentials.objects.create(scopes='[]', leased_time=now - datetime.timedelta(minutes=minutes))
+            for minutes in (3, 2, 1)
+        ]
+
+    def test_least_recently_leased_credentials_go_first(self):
+        self.assertEqual([lease_access_credentials() for noop in range(4)], [self.a, self.b, self.c, self.a])
+
+    def test_rate_limited_and_inactive_credentials_are_skipped(self):
+        rate_limited_until = timezone.now() + datetime.timedelta(minutes=1)
+        AccessCredentials.objects.filter(id=self.a.id).update(rate_limited_until=rate_limited_until)
+        AccessCredentials.objects.filter(id=self.b.id).update(is_active=False)
+
+        self.assertEqual([lease_access_credentials() for noop in range(2)], [self.c, self.c])
+
+    def test_credentials_available_soonest_are_leased_when_all_are_rate_limited(self):
+        now = timezone.now()
+        for ac, minutes in ((self.a, 5), (self.b, 1), (self.c, 3)):
+            ac.rate_limited_until = now + datetime.timedelta(minutes=minutes)
+            ac.save()
+
+        self.assertEqual(lease_access_credentials(), self.b)
+
+    @override_settings(GSHEETS={'CREDENTIAL_POOL': False})
+    def test_latest_credentials_are_used_without_a_pool(self):
+        self.assertEqual([lease_access_credentials() for noop in range(2)], [self.c, self.c])
+
+    def test_no_credentials(self):
+        AccessCredentials.objects.all().delete()
+
+        with self.assertRaises(ValueError):
+            lease_access_credentials()
+
+    def test_rate_limited_interfaces_rotate_credentials(self):
+        interface = BaseSheetInterface(get_fake_model(), 'spreadsheet', sheet_name='Sheet1')
+        interface._access_credentials, interface._credentials = self.a, 'credentials'
+        details = {'args': (interface,)}
+
+        try:
+            raise FakeHttpError(500)
+        except FakeHttpError:
+            rotate_rate_limited_credentials(details)
+        self.assertEqual(interface._access_credentials, self.a)
+
+        try:
+            raise FakeHttpError(429)
+        except FakeHttpError:
+            rotate_rate_limited_credentials(details)
+        self.assertIsNone(interface._access_credentials)
+        self.assertIsNone(interface._credentials)
+
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.rate_limit_count, 1)
+        self.assertGreater(self.a.rate_limited_until, timezone.now() + datetime.timedelta(seconds=50))
+
+    def test_clients_rotate_per_thread(self):
+        clients = SheetClients()
+        clients._local.access_credentials, clients._local.credentials = self.b, 'credentials'
+
+        self.assertTrue(clients.rotate())
+        self.assertEqual(clients._local.__dict__, {})
+        self.assertEqual(AccessCredentials.objects.get(id=self.b.id).rate_limit_count, 1)
+
+    @override_settings(GSHEETS={'CREDENTIAL_POOL': False})
+    def test_credentials_dont_rotate_without_a_pool(self):
+        self.assertFalse(SheetClients().rotate())
+
+
+class RetryTestCase(SimpleTestCase):
+    def call_with_retries(self, error):
+        """ calls a function failing with `error` through the retry policy of `backoff_on_http_error`, without waits
+        :return: `int` the number of calls made
+        """
+        calls = []
+
+        @decorators.backoff_on_exception(
+            decorators.constant, FakeHttpError, max_tries=3, giveup=is_permanent_error, jitter=None, interval=0
+        )
+        def request():
+            calls.append(error)
+            raise error
+
+        with self.assertRaises(FakeHttpError):
+            request()
+
+        return len(calls)
+
+    def test_permanent_errors_give_up_right_away(self):
+        for status in (400, 403, 404):
+            self.assertEqual(self.call_with_retries(FakeHttpError(status)), 1)
+
+    def test_rate_limits_and_server_errors_are_retried(self):
+        errors = [FakeHttpError(429), FakeHttpError(403, b'{"reason": "userRateLimitExceeded"}'), FakeHttpError(503)]
+        for error in errors:
+            self.assertEqual(self.call_with_retries(error), 3)
+
+    def test_error_classification(self):
+        self.assertTrue(is_rate_limit_error(FakeHttpError(429)))
+        self.assertTrue(is_rate_limit_error(FakeHttpError(403, b'{"reason": "rateLimitExceeded"}')))
+        self.assertFalse(is_rate_limit_error(FakeHttpError(403, b'{"reason": "forbidden"}')))
+        self.assertFalse(is_rate_limit_error(FakeHttpError(500)))
+        self.assertFalse(is_permanent_error(FakeHttpError(500)))
+        self.assertTrue(is_permanent_error(FakeHttpError(404)))
+        self.assertTrue(is_permanent_error(ValueError('no status')))
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'gsheets-tests'}}
+DUMMY_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReadCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.fetches = []
+        cache.get_cache().clear()
+
+    def fetch(self):
+        self.fetches.append(None)
+        return [['a', 'b']]
+
+    def read(self):
+        return cache.read_through('spreadsheet', 'Sheet1', 'A1:B', {}, 60, self.fetch)
+
+    def test_reads_are_cached_until_the_sheet_is_written_to(self):
+        self.assertEqual(self.read(), [['a', 'b']])
+        self.assertEqual(self.read(), [['a', 'b']])
+        self.assertEqual(len(self.fetches), 1)
+
+        generation = cache.get_generation('spreadsheet', 'Sheet1')
+        cache.invalidate_sheet('spreadsheet', 'Sheet1')
+        self.assertEqual(cache.get_generation('spreadsheet', 'Sheet1'), generation + 1)
+        self.read()
+        self.assertEqual(len(self.fetches), 2)
+
+    def assertCacheDisabled(self):
+        self.assertIsNone(cache.get_cache())
+        backend = type(caches['default'])
+        methods = {name: mock.DEFAULT for name in ('add', 'get', 'incr', 'set')}
+        with mock.patch.multiple(backend, **methods) as calls:
+            cache.invalidate_sheet('spreadsheet', 'Sheet1')
+            self.assertEqual(cache.get_generation('spreadsheet', 'Sheet1'), 0)
+            self.read()
+            self.read()
+
+        self.assertEqual(len(self.fetches), 2)
+        self.assertEqual([name for name, method in calls.items() if method.called], [])
+
+    @override_settings(GSHEETS={'CACHE_ALIAS': None})
+    def test_no_cache_alias_disables_the_cache(self):
+        self.assertCacheDisabled()
+
+    @override_settings(CACHES=DUMMY_CACHES)
+    def test_dummy_cache_disables_the_cache(self):
+        self.assertCacheDisabled()
+
+    def test_empty_sheet_has_no_headers_or_rows(self):
+        interface = BaseSheetInterface(get_fake_model(), 'spreadsheet', sheet_name='Sheet1')
+        interface.read_values = lambda: []
+
+        self.assertEqual(interface.sheet_data, [])
+        self.assertEqual(interface.sheet_headers, [])
+
+
+class SheetQuerySetTestCase(SimpleTestCase):
+    headers = ['Django GUID', 'make', 'year', 'notes']
+    rows = [['1', 'Ford', '2019', 'red'], ['2', 'Kia', '2020'], ['3', 'Ford', '2020', ''], ['4', 'Ford']]
+
+    def get_queryset(self, columnar=False):
+        rows = ColumnarSheetData(self.rows) if columnar else [list(row) for row in self.rows]
+        return SheetQuerySet(self.headers, rows, key_column='Django GUID')
+
+    def test_lookups(self):
+        for columnar in (False, True):
+            cars = self.get_queryset(columnar)
+
+            self.assertEqual(len(cars), 4)
+            self.assertEqual(cars.get(pk=2), {'Django GUID': '2', 'make': 'Kia', 'year': '2020', 'notes': ''})
+            self.assertEqual(cars.filter(make='Ford').values_list('Django GUID', flat=True), ['1', '3', '4'])
+            self.assertEqual(cars.filter(make='Ford', year__in=[2020, 2021]).values('Django GUID', 'notes'), [
+                {'Django GUID': '3', 'notes': ''}
+            ])
+            self.assertEqual(cars.filter(year='').values_list('Django GUID', 'make'), [('4', 'Ford')])
+            self.assertFalse(cars.filter(make='Audi').exists())
+            self.assertIsNone(cars.filter(make='Audi').first())
+
+    def test_get_errors(self):
+        cars = self.get_queryset()
+
+        with self.assertRaises(ObjectDoesNotExist):
+            cars.get(pk='5')
+        with self.assertRaises(MultipleObjectsReturned):
+            cars.get(make='Ford')
+        with self.assertRaises(KeyError):
+            cars.filter(colour='red')
+        with self.assertRaises(TypeError):
+            cars.values_list('make', 'year', flat=True)
+
+    def test_derived_querysets_share_indexes(self):
+        cars = self.get_queryset()
+        fords = cars.filter(make='Ford')
+        list(fords)
+
+        with mock.patch.object(SheetQuerySet, 'get_cell', side_effect=AssertionError('index rebuilt')):
+            self.assertEqual(cars.filter(make='Kia').count(), 1)
+        self.assertEqual(set(cars._indexes), {1})
+
+    def test_memoized_queries_are_rebuilt_when_the_sheet_changes(self):
+        builds = []
+
+        def build():
+            builds.append(None)
+            return self.get_queryset()
+
+        key = ('gsheets.Fake', 'spreadsheet', 'Sheet1')
+        first = get_memoized_query(key, 1, 60, build)
+        self.assertIs(get_memoized_query(key, 1, 60, build), first)
+        self.assertIsNot(get_memoized_query(key, 2, 60, build), first)
+        # without a ttl nothing is reused
+        get_memoized_query(key, 2, None, build)
+        get_memoized_query(key, 2, None, build)
+
+        self.assertEqual(len(builds), 4)
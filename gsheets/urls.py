@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import OAuthSuccessView, AuthorizeView
+from .views import OAuthSuccessView, AuthorizeView, SheetEditView
 
 urlpatterns = [
     path('gsheets/authorize/', AuthorizeView.as_view(), name='gsheets_authorize'),
-    path('gsheets/auth-success/', OAuthSuccessView.as_view(), name='gsheets_auth_success')
+    path('gsheets/auth-success/', OAuthSuccessView.as_view(), name='gsheets_auth_success'),
+    path('gsheets/sheet-edits/', SheetEditView.as_view(), name='gsheets_sheet_edits'),
 ]
@@ -0,0 +1,234 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+from decimal import Decimal
+import datetime
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+# day zero of Google Sheets serial dates
+SERIAL_EPOCH = datetime.datetime(1899, 12, 30)
+TRUE_STRINGS = {'true', 't', 'yes', 'y', '1'}
+FALSE_STRINGS = {'false', 'f', 'no', 'n', '0'}
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def serial_to_datetime(value):
+    """ converts a Sheets serial number (days since 1899-12-30, the fraction being the time of day) to a datetime """
+    return SERIAL_EPOCH + datetime.timedelta(days=value)
+
+
+def datetime_to_serial(value):
+    """ converts a date or datetime to a Sheets serial number """
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.make_naive(value)
+        delta = value - SERIAL_EPOCH
+        return delta.days + delta.seconds / 86400 + delta.microseconds / 86400e6
+
+    return (value - SERIAL_EPOCH.date()).days
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    if is_number(value):
+        return bool(value)
+
+    lowered = value.strip().lower()
+    if lowered in TRUE_STRINGS:
+        return True
+    if lowered in FALSE_STRINGS:
+        return False
+
+    raise ValueError(f'{value} is not a boolean')
+
+
+def parse_int(value):
+    if is_number(value):
+        return int(value)
+
+    return int(value.replace(',', ''))
+
+
+def parse_float(value):
+    if is_number(value):
+        return float(value)
+
+    return float(value.replace(',', ''))
+
+
+def parse_decimal(value):
+    # going through str keeps the shortest decimal representation of floats
+    return Decimal(str(value).replace(',', ''))
+
+
+def parse_date_value(value):
+    if is_number(value):
+        return serial_to_datetime(value).date()
+
+    return parse_date(value.strip())
+
+
+def parse_datetime_value(value):
+    parsed = serial_to_datetime(value) if is_number(value) else parse_datetime(value.strip())
+    if parsed is not None and settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+
+    return parsed
+
+
+def parse_time_value(value):
+    if is_number(value):
+        return serial_to_datetime(value % 1).time()
+
+    return parse_time(value.strip())
+
+
+def parse_string(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    return str(value)
+
+
+# checked in order, so subclasses come before the fields they extend
+FIELD_PARSERS = [
+    ((models.BooleanField, getattr(models, 'NullBooleanField', models.BooleanField)), parse_bool),
+    ((models.IntegerField, models.AutoField), parse_int),
+    ((models.FloatField,), parse_float),
+    ((models.DecimalField,), parse_decimal),
+    ((models.DateTimeField,), parse_datetime_value),
+    ((models.DateField,), parse_date_value),
+    ((models.TimeField,), parse_time_value),
+    ((models.CharField, models.TextField), parse_string),
+]
+
+
+class ValuePlan(object):
+    """ converts unformatted sheet values to python values and back, with one converter per model field compiled from
+    the Django field types. Unformatted reads give numbers, booleans and serial dates as they're stored in the sheet,
+    so conversion is a typed pass instead of parsing formatted strings
+    """
+    def __init__(self, model_cls):
+        self.parsers = {}
+        self.nullable = {}
+
+        for field in model_cls._meta.concrete_fields:
+            for field_types, parser in FIELD_PARSERS:
+                if isinstance(field, field_types):
+                    self.parsers[field.name] = parser
+                    self.nullable[field.name] = field.null
+                    break
+
+    def parse(self, field, value):
+        """ converts an unformatted sheet value to the python value of the given field
+        :param field: `str` model field name
+        :param value: `str`, `int`, `float` or `bool` as read from the sheet
+        :return: the converted value, or the value as is if the field has no parser or it can't be converted
+        """
+        parser = self.parsers.get(field)
+        if parser is None:
+            return value
+
+        if value == '' or value is None:
+            return None if self.nullable[field] or parser is not parse_string else ''
+
+        try:
+            parsed = parser(value)
+        except (ValueError, ArithmeticError, AttributeError, TypeError):
+            parsed = None
+
+        if parsed is None:
+            # Django's date and time parsers return None for strings they can't parse instead of raising
+            logger.debug(f'could not convert {value!r} for field {field}, leaving it as is')
+            return value
+
+        return parsed
+
+    def parse_row(self, row_data):
+        """ converts a `dict` of field/values read from the sheet in place """
+        for field, value in row_data.items():
+            if field in self.parsers:
+                row_data[field] = self.parse(field, value)
+
+    @staticmethod
+    def serialize(value):
+        """ converts a python value to a value the Sheets API stores natively (dates become serial numbers)
+        :param value: python value of a model field
+        :return: `str`, `int`, `float` or `bool`
+        """
+        if value is None:
+            return ''
+        if isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return datetime_to_serial(value)
+        if isinstance(value, datetime.time):
+            return (value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6) / 86400
+
+        return str(value)
+
+
+def parse_formatted_number(value):
+    """ converts a formatted sheet value to the number it shows, reading dates and times as serial numbers
+    :param value: `str` formatted cell value, like '1,234.50', '2020-01-31' or '13:45:30'
+    :return: `float`, or None if the value isn't a number, an ISO date or time
+    """
+    value = value.strip()
+    try:
+        return float(value.replace(',', ''))
+    except ValueError:
+        pass
+
+    try:
+        parsed = parse_datetime(value) or parse_date(value) or parse_time(value)
+    except ValueError:
+        # well formatted but invalid, like '2020-02-30'
+        return None
+
+    return ValuePlan.serialize(parsed) if parsed is not None else None
+
+
+def cell_holds_value(cell, value):
+    """ checks whether a cell read from the sheet already holds a value about to be pushed. Formatted reads give
+    strings like 'TRUE', '1,234.50' or '2020-01-31' for cells written as booleans, numbers and dates, so both sides
+    are compared as `ValuePlan.serialize` stores them
+    :param cell: cell value as read from the sheet, formatted or not
+    :param value: python value about to be pushed
+    :return: `bool`
+    """
+    value = ValuePlan.serialize(value)
+    if cell is None:
+        cell = ''
+
+    if isinstance(value, bool):
+        return cell is value or (isinstance(cell, str) and cell.strip().upper() == str(value).upper())
+    if is_number(value):
+        if isinstance(cell, str):
+            cell = parse_formatted_number(cell)
+        return is_number(cell) and math.isclose(cell, value, rel_tol=1e-9, abs_tol=1e-9)
+
+    if isinstance(cell, bool):
+        return str(cell).upper() == value.upper()
+
+    return parse_string(cell) == value
+
+
+_value_plans = {}
+
+
+def get_value_plan(model_cls):
+    """ gets the compiled value plan of a model, compiling it on first use """
+    if model_cls not in _value_plans:
+        _value_plans[model_cls] = ValuePlan(model_cls)
+
+    return _value_plans[model_cls]
@@ -1,26 +1,28 @@
 from django.shortcuts import render, redirect
-from django.views.generic import TemplateView
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import TemplateView, View
 from django.urls import reverse
 from django.core.exceptions import ObjectDoesNotExist
-from django.core import cache
 from .settings import gsheets_settings
-from .models import AccessCredentials
-from .auth import get_oauth_cb_url, ensure_https
-import google.oauth2.credentials
-import google_auth_oauthlib.flow
-import googleapiclient.discovery
+from .models import AccessCredentials, SheetEdit
+from .auth import get_oauth_cb_url, get_oauth_flow, ensure_https
 import logging
+import hashlib
+import hmac
 import json
 import re
 
 logger = logging.getLogger(__name__)
 
+# spreadsheets hold at most 10 million cells, so no sheet has more rows than that
+SHEET_MAX_ROWS = 10000000
+
 
 class AuthorizeView(TemplateView):
     def get(self, request, *args, **kwargs):
-        flow = google_auth_oauthlib.flow.Flow.from_client_secrets_file(
-            gsheets_settings.CLIENT_SECRETS, scopes=gsheets_settings.SCOPES
-        )
+        flow = get_oauth_flow()
 
         # The URI created here must exactly match one of the authorized redirect URIs
         # for the OAuth 2.0 client, which you configured in the API Console. If this
@@ -50,11 +52,7 @@ class OAuthSuccessView(TemplateView):
         # verified in the authorization server response.
         state = request.session['state']
 
-        flow = google_auth_oauthlib.flow.Flow.from_client_secrets_file(
-            gsheets_settings.CLIENT_SECRETS,
-            scopes=gsheets_settings.SCOPES,
-            state=state
-        )
+        flow = get_oauth_flow(state=state)
         flow.redirect_uri = get_oauth_cb_url(request)
 
         # Use the authorization server's response to fetch the OAuth 2.0 tokens.
@@ -80,3 +78,60 @@ class OAuthSuccessView(TemplateView):
 
         # redirect to admin page for the AC
         return redirect(reverse('admin:gsheets_accesscredentials_change', args=(ac.id,)))
+
+
+def parse_row_numbers(rows):
+    """ validates the row numbers of a sheet edit notification
+    :param rows: `list` of row numbers, as `int` or digit `str`
+    :return: `set` of `int` row numbers
+    :raises: `ValueError` if rows isn't a list of row numbers between 1 and `SHEET_MAX_ROWS`
+    """
+    if not isinstance(rows, list):
+        raise ValueError(f'rows must be a list, got {rows!r}')
+
+    row_numbers = set()
+    for row in rows:
+        if (isinstance(row, bool) or not isinstance(row, (int, str)) or not str(row).isdigit()
+                or not 1 <= int(row) <= SHEET_MAX_ROWS):
+            raise ValueError(f'{row!r} is not a row number')
+        row_numbers.add(int(row))
+
+    return row_numbers
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class SheetEditView(View):
+    """ accepts edit notifications - like the ones sent by an Apps Script onEdit trigger - and queues the edited rows
+    to be pulled by the `pullsheetedits` management command. The request body is JSON like
+    `{"spreadsheet_id": "...", "sheet_name": "Sheet1", "rows": [2, 5]}` and must be signed with the hex HMAC-SHA256
+    of the body under the `WEBHOOK_SECRET` setting, sent in the `X-GSheets-Signature` header
+    """
+    def post(self, request, *args, **kwargs):
+        secret = gsheets_settings.WEBHOOK_SECRET
+        if not secret:
+            raise Http404('sheet edit notifications are disabled')
+
+        signature = request.META.get('HTTP_X_GSHEETS_SIGNATURE', '')
+        expected_signature = hmac.new(secret.encode(), request.body, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(signature, expected_signature):
+            logger.warning('rejecting sheet edit notification with a bad signature')
+            return HttpResponseForbidden()
+
+        try:
+            payload = json.loads(request.body)
+            spreadsheet_id, sheet_name = payload['spreadsheet_id'], payload['sheet_name']
+            rows = parse_row_numbers(payload['rows'])
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f'rejecting malformed sheet edit notification: {e!r}')
+            return HttpResponseBadRequest()
+
+        if not all(isinstance(value, str) and value for value in (spreadsheet_id, sheet_name)):
+            return HttpResponseBadRequest()
+
+        SheetEdit.objects.bulk_create([
+            SheetEdit(spreadsheet_id=spreadsheet_id, sheet_name=sheet_name, row=row) for row in sorted(rows)
+        ])
+
+        logger.debug(f'queued {len(rows)} edited rows of {sheet_name} in spreadsheet {spreadsheet_id}')
+
+        return JsonResponse({'queued': len(rows)}, status=202)
@@ -0,0 +1,139 @@
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from .clients import SheetClients
+from .settings import gsheets_settings
+from .syncing import is_syncing
+import threading
+import atexit
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer(object):
+    """ in-process buffer of the primary keys of changed model instances. A background thread flushes the buffer every
+    `WRITE_BEHIND_INTERVAL` milliseconds - or as soon as `WRITE_BEHIND_MAX_ROWS` changes are pending - pushing each
+    model's changed rows to its sheet in one batched upsert. Repeated saves of the same instance between flushes
+    collapse into a single row write
+    """
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._clients = None
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(pks) for pks in self._pending.values())
+
+    def add(self, model, pk):
+        """ marks the instance of the given model with the given primary key as changed
+        :param model: `SheetPushableMixin` model class
+        :param pk: primary key of the changed instance
+        """
+        with self._lock:
+            # dicts keep insertion order, so rows are pushed in the order they first changed
+            self._pending.setdefault(model, {})[pk] = None
+            size = sum(len(pks) for pks in self._pending.values())
+
+        self._ensure_thread()
+
+        if size >= gsheets_settings.WRITE_BEHIND_MAX_ROWS:
+            self._wakeup.set()
+
+    def discard(self, model, pk):
+        """ drops a pending change, for instance because the instance has been deleted
+        :param model: `SheetPushableMixin` model class
+        :param pk: primary key of the instance
+        """
+        with self._lock:
+            self._pending.get(model, {}).pop(pk, None)
+
+    @property
+    def clients(self):
+        """ the credentials and API clients of every flush, so flushes don't load credentials and fetch the API
+        discovery document all over again
+        """
+        if self._clients is None:
+            self._clients = SheetClients()
+
+        return self._clients
+
+    def flush(self):
+        """ pushes all pending changes to their sheets
+        :return: `int` the number of changed instances that were flushed
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        flushed = 0
+        for model, pks in pending.items():
+            if not pks:
+                continue
+
+            logger.debug(f'flushing {len(pks)} buffered changes for model {model}')
+            try:
+                model.push_rows_to_sheet(list(pks), clients=self.clients)
+                flushed += len(pks)
+            except Exception:
+                logger.exception(f'failed to push {len(pks)} buffered changes for model {model}, retrying next flush')
+                self.restore(model, pks)
+
+        return flushed
+
+    def restore(self, model, pks):
+        """ puts the changes of a failed flush back in the buffer, ahead of the changes buffered since
+        :param model: `SheetPushableMixin` model class
+        :param pks: `dict` of primary keys whose push failed
+        """
+        with self._lock:
+            pending = dict(pks)
+            pending.update(self._pending.get(model, {}))
+            self._pending[model] = pending
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='gsheets-write-behind', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(gsheets_settings.WRITE_BEHIND_INTERVAL / 1000)
+            self._wakeup.clear()
+
+            if self.flush() > 0:
+                # the flush ran on this thread's own DB connection, don't hold it open between flushes
+                connection.close()
+
+
+write_behind_buffer = WriteBehindBuffer()
+atexit.register(write_behind_buffer.flush)
+
+
+def buffer_saved_instance(sender, instance=None, raw=False, **kwargs):
+    if raw or is_syncing():
+        # fixtures and rows pulled from the sheet are already in line with it
+        return
+
+    pk = instance.pk
+    # only push the change once it's visible to the flushing thread
+    transaction.on_commit(lambda: write_behind_buffer.add(sender, pk))
+
+
+def discard_deleted_instance(sender, instance=None, **kwargs):
+    # deletions don't propagate to the sheet, but there's no point pushing a row that no longer exists
+    pk = instance.pk
+    transaction.on_commit(lambda: write_behind_buffer.discard(sender, pk))
+
+
+def connect_write_behind(model):
+    """ hooks a model's save and delete signals up to the write-behind buffer
+    :param model: `SheetPushableMixin` model class
+    """
+    post_save.connect(buffer_saved_instance, sender=model, dispatch_uid=f'gsheets_write_behind_save_{model._meta.label}')
+    post_delete.connect(discard_deleted_instance, sender=model, dispatch_uid=f'gsheets_write_behind_delete_{model._meta.label}')